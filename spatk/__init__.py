@@ -16,11 +16,16 @@
 
 import os
 
-from spatk.circuit import Circuit
+from spatk.circuit import Circuit, iterparse
 
 from .flavours import ngspice
 from .flavours import xyce
 from .flavours import generic
 from .flavours import hspice
 
+from . import cache
+from . import table
+from . import query
+from . import template
+
 
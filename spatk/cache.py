@@ -0,0 +1,156 @@
+# SPATK - Spice Analysis ToolKit
+# Copyright (C) 2026 Christoph Weiser
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import pickle
+import hashlib
+import tempfile
+
+# Bump when the pickled Circuit state changes.
+CACHE_VERSION = 2
+
+# Entries that have not been used for MAX_AGE seconds are pruned, as
+# well as the least recently used entries beyond MAX_ENTRIES.
+MAX_AGE = 30 * 24 * 3600
+MAX_ENTRIES = 256
+
+
+def cache_key(netlist, is_filename, elementmap, element_settings, **options):
+    """ Create the cache key of a netlist.
+
+    Required inputs:
+    ----------------
+    netlist (str, list):        SPICE netlist or path to a netlist.
+    is_filename (bool):         netlist is a path.
+    elementmap (dict):          SPICE elementmap.
+    element_settings (dict):    Element specific settings.
+
+
+    Optional inputs:
+    ----------------
+    options:                    Further options that change the 
+                                parsed Circuit.
+
+
+    Returns
+    ----------------
+    key (str):                  sha256 hexdigest of the input bytes,
+                                the elementmap, the element settings
+                                and the options.
+    """
+    h = hashlib.sha256()
+    if is_filename:
+        with open(netlist, "rb") as ifile:
+            for chunk in iter(lambda: ifile.read(1 << 20), b""):
+                h.update(chunk)
+    elif isinstance(netlist, str):
+        h.update(netlist.encode())
+    else:
+        for line in netlist:
+            h.update(line.encode())
+            h.update(b"\n")
+    elements = sorted("{}={}.{}".format(k, v.__module__, v.__qualname__) 
+                      for k, v in elementmap.items() if v)
+    h.update(repr((CACHE_VERSION, 
+                   elements, 
+                   repr(element_settings),
+                   sorted(options.items()))).encode())
+    return h.hexdigest()
+
+
+def cache_file(cache_dir, key):
+    """ Path of the cache entry of key. """
+    return os.path.join(cache_dir, "{}.pickle".format(key))
+
+
+def load(cache_dir, key):
+    """ Load a cached state.
+
+    Required inputs:
+    ----------------
+    cache_dir (str):    Cache directory.
+    key (str):          Cache key, see cache_key().
+
+
+    Returns
+    ----------------
+    state (object):     Cached state or None if there is no
+                        (readable) entry for the key.
+    """
+    path = cache_file(cache_dir, key)
+    try:
+        with open(path, "rb") as ifile:
+            state = pickle.load(ifile)
+    except (OSError, EOFError, pickle.UnpicklingError, 
+            AttributeError, ImportError):
+        return None
+    # Mark the entry as recently used
+    os.utime(path)
+    return state
+
+
+def store(cache_dir, key, state):
+    """ Store a state in the cache and prune stale entries.
+
+    Required inputs:
+    ----------------
+    cache_dir (str):    Cache directory.
+    key (str):          Cache key, see cache_key().
+    state (object):     Picklable state.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as ofile:
+            pickle.dump(state, ofile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file(cache_dir, key))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    prune(cache_dir)
+
+
+def prune(cache_dir, max_age=None, max_entries=None):
+    """ Remove stale cache entries.
+
+    Required inputs:
+    ----------------
+    cache_dir (str):    Cache directory.
+
+
+    Optional inputs:
+    ----------------
+    max_age (int):      Remove entries unused for max_age seconds.
+    max_entries (int):  Number of most recently used entries to keep.
+    """
+    if max_age is None:
+        max_age = MAX_AGE
+    if max_entries is None:
+        max_entries = MAX_ENTRIES
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".pickle"):
+            entries.append((entry.stat().st_mtime, entry.path))
+    entries.sort(reverse=True)
+    now = time.time()
+    for i, (mtime, path) in enumerate(entries):
+        if i >= max_entries or now - mtime > max_age:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -14,27 +14,557 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import re
 import copy
-import datetime
+import itertools
 import collections
+import concurrent.futures
 
 
 from spatk.helpers import (read_netlist, 
+                           file_lines,
+                           mmap_lines,
+                           compression,
+                           open_netlist,
+                           netlist_header,
+                           write_chunks,
                            dissect_param,
                            clean_netlist,
-                           filter,
-                           touches,
-                           count_nets,
-                           element_types,
-                           get_uid,
-                           map_linetype)
+                           clean_lines,
+                           md5_uid,
+                           spice_number,
+                           IntUid,
+                           find_include,
+                           library_section,
+                           LinetypeTable)
+
+from spatk.helpers import uid_scheme as get_uid_scheme
+
+from spatk.genelems import (Include, 
+                            Library, 
+                            Subckt, 
+                            SubcktDef, 
+                            Global, 
+                            Component, 
+                            Statement, 
+                            Comment, 
+                            Owner, 
+                            Args, 
+                            Tokens)
+
+from spatk import cache
+
+from spatk.table import ElementTable, InternTable
+
+from spatk.index import (NetIndex, 
+                         NameIndex, 
+                         TypeIndex, 
+                         BucketIndex, 
+                         NumericIndex, 
+                         HierarchyIndex)
+
+from spatk.query import Query, field
+
+from spatk.template import Template
 
 from spatk.flavours.generic import elementmap as generic_map
 from spatk.flavours.xyce    import elementmap as xyce_map
 from spatk.flavours.ngspice import elementmap as ngspice_map
 from spatk.flavours.hspice  import elementmap as hspice_map
 
+elementmaps = {"generic":   generic_map,
+               "xyce":      xyce_map,
+               "ngspice":   ngspice_map,
+               "hspice":    hspice_map}
+
+regex_nreq          = re.compile(r"^$|^\.end$")
+reqex_subckt_s      = re.compile(r"^.subckt*")
+reqex_subckt_e      = re.compile(r"^.ends.*")
+reqex_control_s     = re.compile(r"^.control")
+reqex_control_e     = re.compile(r"^.endc")
+reqex_library_def_s = re.compile(r"^.lib [a-zA-Z0-9_.-]*$") 
+reqex_library_def_e = re.compile(r"^.endl.*")
+
+
+def parse_records(netlist, elementmap, offset=0, linetypes=None, uid=None):
+    """ Parse cleaned netlist lines into element records.
+
+    Required inputs:
+    ----------------
+    netlist (str, iter):        Cleaned SPICE netlist line or any
+                                iterable of cleaned lines.
+    elementmap (dict):          SPICE elementmap.
+
+
+    Optional inputs:
+    ----------------
+    offset (int):               Line number of the first line.
+    linetypes (LinetypeTable):  Compiled elementmap, compiled from
+                                elementmap if not given.
+    uid (func):                 uid function, see uid_scheme(). 
+                                Defaults to md5_uid.
+
+
+    Returns
+    ----------------
+    records (iter):             (uid, record) tuples in netlist order.
+                                A record is the tuple (line, elemtype,
+                                location, library, n) from which the 
+                                element is built by build_element().
+
+
+    Description
+    ----------------
+    The lines are consumed one at a time, only the hierarchy,
+    library and control section state is kept between lines.
+    Lines of unknown element types or of types without an element 
+    class in the elementmap raise a ValueError.
+    """
+    ctlsec = False
+    hierarchy = collections.deque()
+    hierarchy.append("/")
+    library = None
+
+    if linetypes is None:
+        linetypes = LinetypeTable(elementmap)
+    lookup = linetypes.lookup
+    if uid is None:
+        uid = md5_uid
+
+    n = offset
+
+    if isinstance(netlist, str):
+        netlist = [netlist]
+
+    for line in netlist:
+
+        if not re.match(regex_nreq, line):
+
+            if re.match(reqex_subckt_s, line):
+                hierarchy.append(line.split(" ")[1])
+
+            if re.match(reqex_library_def_s, line):
+                library = line.split(" ")[1]
+
+            if re.match(reqex_control_s, line) or ctlsec:
+                ctlsec = True
+                if re.match(reqex_control_e, line):
+                    ctlsec = False
+            else:
+                elemtype = lookup(line)
+                if len(hierarchy) == 1:
+                    location = hierarchy[0]
+                else:
+                    location = "/".join(hierarchy)[1:]
+                if elementmap.get(elemtype) is None:
+                    raise ValueError("Unsupported element: {}".format(line))
+                if elemtype ==  ".PARAM":
+                    for k, param in enumerate(dissect_param(line)):
+                        yield (uid(param, n, location, k), 
+                               (param, elemtype, location, library, n))
+                else:
+                    yield (uid(line, n, location, 0), 
+                           (line, elemtype, location, library, n))
+
+            if re.match(reqex_subckt_e, line):
+                hierarchy.pop()
+
+            if re.match(reqex_library_def_e, line):
+                library = None
+
+        n = n + 1;
+
+
+def build_element(uid, record, elementmap, element_settings=[]):
+    """ Build a circuit element from its record.
+
+    Required inputs:
+    ----------------
+    uid (str):                  uid of the element.
+    record (tuple):             Element record, see parse_records().
+    elementmap (dict):          SPICE elementmap.
+
+
+    Optional inputs:
+    ----------------
+    element_settings (dict):    Element specific settings.
+
+
+    Returns
+    ----------------
+    element (Default):          Circuit element.
+    """
+    line, elemtype, location, library, n = record
+    element = elementmap[elemtype]
+    cls = element.__name__
+    if cls in element_settings:
+        settings = element_settings[cls]
+    else:
+        settings = []
+    return element(line, location, library, n, uid, settings)
+
+
+def parse_netlist(netlist, 
+                  elementmap, 
+                  element_settings=[], 
+                  offset=0, 
+                  linetypes=None,
+                  uid=None):
+    """ Parse cleaned netlist lines into circuit elements.
+
+    Required inputs:
+    ----------------
+    netlist (str, iter):        Cleaned SPICE netlist line or any
+                                iterable of cleaned lines.
+    elementmap (dict):          SPICE elementmap.
+
+
+    Optional inputs:
+    ----------------
+    element_settings (dict):    Element specific settings.
+    offset (int):               Line number of the first line.
+    linetypes (LinetypeTable):  Compiled elementmap, compiled from
+                                elementmap if not given.
+    uid (func):                 uid function, see uid_scheme(). 
+
+
+    Returns
+    ----------------
+    elements (iter):            Circuit elements in netlist order.
+    """
+    for uid, record in parse_records(netlist, elementmap, offset, linetypes, uid):
+        yield build_element(uid, record, elementmap, element_settings)
+
+
+class LazyElements(dict):
+    """ Circuit elements that are built on first access.
+
+    Required inputs:
+    ----------------
+    elementmap (dict):          SPICE elementmap.
+    element_settings (dict):    Element specific settings.
+
+
+    Optional inputs:
+    ----------------
+    store (bool):               Replace records by the built elements.
+    owner (Circuit):            Circuit the built elements are 
+                                adopted by.
+
+
+    Description
+    ----------------
+    Maps uids to either an element record (see parse_records()) or
+    the element built from it. A record is replaced by its element
+    the first time it is accessed through indexing, get(), values()
+    or items(). Iterating over the uids never builds elements.
+
+    Without store the records are kept and every access builds a
+    new element, which makes it an immutable snapshot.
+    """
+    def __init__(self, elementmap, element_settings=[], store=True, owner=None):
+        super().__init__()
+        self.elementmap = elementmap
+        self.element_settings = element_settings
+        self.store = store
+        self.owner = owner
+
+    def __getitem__(self, uid):
+        element = super().__getitem__(uid)
+        if type(element) is tuple:
+            element = build_element(uid, element, 
+                                    self.elementmap, 
+                                    self.element_settings)
+            if self.owner is not None:
+                self.owner._adopt(element)
+            if self.store:
+                super().__setitem__(uid, element)
+        return element
+
+    def get(self, uid, default=None):
+        if uid in self:
+            return self[uid]
+        return default
+
+    def values(self):
+        return (self[uid] for uid in self)
+
+    def items(self):
+        return ((uid, self[uid]) for uid in self)
+
+    def __reduce__(self):
+        # Pickle records as they are instead of building the elements.
+        return (LazyElements, 
+                (self.elementmap, self.element_settings, self.store), 
+                None, 
+                None, 
+                iter(dict.items(self)))
+
+    def raw(self, uid):
+        """ Element or record of uid without building the element. """
+        return super().__getitem__(uid)
+
+    def copy(self, store=True, owner=None):
+        """ Copy, records are shared and elements are deep copied. """
+        elements = LazyElements(self.elementmap, self.element_settings, store, owner)
+        for uid, element in dict.items(self):
+            if type(element) is not tuple:
+                element = copy.deepcopy(element)
+                if owner is not None:
+                    owner._adopt(element)
+            dict.__setitem__(elements, uid, element)
+        return elements
+
+
+class ElementView(collections.abc.Sequence):
+    """ Live view on the circuit elements of one type.
+
+    Required inputs:
+    ----------------
+    circuit (Circuit):  Circuit to view.
+    elemtype (class):   Element class, subclasses are included.
+
+
+    Description
+    ----------------
+    Behaves like a list of the elements in circuit order, that
+    always reflects the current state of the Circuit. The uids are 
+    taken from the type index of the Circuit and kept until the 
+    index changes.
+    """
+    def __init__(self, circuit, elemtype):
+        self.circuit = circuit
+        self.elemtype = elemtype
+        self._cached = (None, None, [])
+
+    def _uids(self):
+        index = self.circuit._types_index()
+        cached_index, version, uids = self._cached
+        if cached_index is not index or version != index.version:
+            uids = index.uids(self.elemtype)
+            self._cached = (index, index.version, uids)
+        return uids
+
+    def uids(self):
+        """ uids of the viewed elements in circuit order. """
+        return list(self._uids())
+
+    def __len__(self):
+        return self.circuit._types_index().count(self.elemtype)
+
+    def __iter__(self):
+        for uid in self._uids():
+            yield self.circuit[uid]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.circuit[uid] for uid in self._uids()[i]]
+        return self.circuit[self._uids()[i]]
+
+    def __eq__(self, other):
+        if isinstance(other, collections.abc.Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def split_netlist(netlist, chunks):
+    """ Split a cleaned netlist into independently parsable chunks.
+
+    Required inputs:
+    ----------------
+    netlist (list):     Cleaned SPICE netlist lines.
+    chunks (int):       Targeted number of chunks.
+
+
+    Returns
+    ----------------
+    chunks (list):      List of (offset, lines) tuples, where offset
+                        is the line number of the first line.
+
+
+    Description
+    ----------------
+    The netlist is only split in between top level statements,
+    i.e. outside of any .subckt/.ends, .lib/.endl and .control/.endc
+    section. Every chunk therefore starts from the same parser state
+    as the netlist itself and parses to the same elements, line 
+    numbers, locations and uids as the complete netlist.
+    """
+    size = max(1, -(-len(netlist) // max(1, chunks)))
+    depth = 0
+    library = False
+    ctlsec = False
+    splittable = True
+    start = 0
+    split = []
+    for i, line in enumerate(netlist):
+        if (splittable and i - start >= size and 
+            depth == 0 and not library and not ctlsec):
+            split.append((start, netlist[start:i]))
+            start = i
+        if re.match(regex_nreq, line):
+            continue
+        if re.match(reqex_subckt_s, line):
+            depth = depth + 1
+        if re.match(reqex_library_def_s, line):
+            library = True
+        if re.match(reqex_control_s, line) or ctlsec:
+            ctlsec = not re.match(reqex_control_e, line)
+        if re.match(reqex_subckt_e, line):
+            depth = depth - 1
+            if depth < 0:
+                splittable = False
+        if re.match(reqex_library_def_e, line):
+            library = False
+    split.append((start, netlist[start:]))
+    return split
+
+
+def _parse_chunk(args):
+    """ Parse a netlist chunk in a worker process. """
+    offset, lines, elementmap, element_settings, linetypes, lazy, uid = args
+    parsed = []
+    for uid, record in parse_records(lines, elementmap, offset, linetypes, uid):
+        if lazy:
+            parsed.append((uid, record, None))
+        else:
+            element = build_element(uid, record, elementmap, element_settings)
+            parsed.append((uid, record, element))
+    return parsed
+
+
+def iterparse(filename, 
+              syntax="generic", 
+              elementmap=None, 
+              element_settings=[],
+              keep_comments=False,
+              use_mmap=False):
+    """ Iterate over the elements of a netlist file.
+
+    Required inputs:
+    ----------------
+    filename (str):             Name/path of the netlist file.
+
+
+    Optional inputs:
+    ----------------
+    syntax (str):               SPICE flavour of the netlist.
+    elementmap (dict):          SPICE elementmap, overrides syntax.
+    element_settings (dict):    Element specific settings.
+    keep_comments (bool):       Dont remove SPICE comments.
+    use_mmap (bool):            Read the file through a memory map.
+
+
+    Returns
+    ----------------
+    elements (iter):            Circuit elements in netlist order.
+
+
+    Description
+    ----------------
+    The file is read (and decompressed), cleaned and parsed 
+    incrementally and the elements are yielded one by one. No 
+    Circuit is built, so the memory use does not grow with the
+    size of the netlist. 
+    Use this for read-only scans over large netlists.
+    """
+    if not elementmap:
+        elementmap = elementmaps.get(syntax, generic_map)
+    if use_mmap and not compression(filename):
+        lines = clean_lines(mmap_lines(filename, keep_comments), keep_comments)
+        yield from parse_netlist(lines, elementmap, element_settings)
+        return
+    with open_netlist(filename, "r") as ifile:
+        lines = clean_lines(file_lines(ifile), keep_comments)
+        yield from parse_netlist(lines, elementmap, element_settings)
+
+
+include_cache = dict()
+
+
+def clear_include_cache():
+    """ Clear the process-wide cache of included files. """
+    include_cache.clear()
+
+
+def load_include(path, 
+                 section=None, 
+                 elementmap=None, 
+                 element_settings=[], 
+                 search_paths=[],
+                 active=None):
+    """ Load an included file through the process-wide cache.
+
+    Required inputs:
+    ----------------
+    path (str):                 Path of the included file.
+
+
+    Optional inputs:
+    ----------------
+    section (str):              Library section to load.
+    elementmap (dict):          SPICE elementmap.
+    element_settings (dict):    Element specific settings.
+    search_paths (list):        Directories to search for nested 
+                                includes.
+    active (set):               Files that are being resolved, used 
+                                to break include cycles.
+
+
+    Returns
+    ----------------
+    circuit (Circuit):          Circuit of the file or library section,
+                                None for a cyclic include.
+
+
+    Description
+    ----------------
+    Each file (and library section) is parsed once per process and 
+    cached by path, modification time, section, elementmap and
+    element settings. 
+    Includes of the loaded file are resolved recursively. The 
+    returned Circuit is shared by everyone that includes the file 
+    and should therefore be treated as read-only.
+    """
+    if not elementmap:
+        elementmap = generic_map
+    path = os.path.abspath(path)
+    key = (path, 
+           os.stat(path).st_mtime_ns, 
+           section, 
+           id(elementmap), 
+           repr(element_settings))
+    if key in include_cache:
+        return include_cache[key]
+    if active is None:
+        active = set()
+    if key in active:
+        return None
+    active.add(key)
+    try:
+        if section:
+            lines = library_section(read_netlist(path), section)
+            cir = Circuit(lines, 
+                          elementmap=elementmap, 
+                          element_settings=element_settings,
+                          is_filename=False)
+            cir.name = path
+            cir.filename = path
+        else:
+            cir = Circuit(path, 
+                          elementmap=elementmap, 
+                          element_settings=element_settings)
+        cir.resolve_includes(search_paths, active)
+    finally:
+        active.discard(key)
+    include_cache[key] = cir
+    return cir
+
+
 class Circuit:
     """ Circuit represents a abstract SPICE netlist.
 
@@ -49,6 +579,33 @@ class Circuit:
                             netlist. Default assumes a path.
                             If this is set the input netlist needs to 
                             be a netlist as a string or a list of strings.
+    use_mmap (bool):        Read the netlist file through a memory map
+                            instead of reading it into one string.
+                            Recommended for very large netlists.
+    workers (int):          Parse the netlist in a pool of worker 
+                            processes. See parse().
+    lazy (bool):            Only keep the netlist line, type and location
+                            of each element and build the element on 
+                            first access. Untouched elements are written
+                            out verbatim.
+    resolve_includes (bool):
+                            Parse the files of .include and .lib file 
+                            section statements recursively into 
+                            includes. See resolve_includes().
+    search_paths (list):    Directories searched for included files
+                            after the directory of the netlist.
+    cache_dir (str):        Directory of an on-disk cache of parsed
+                            netlists. The cache is keyed by a hash of 
+                            the input, elementmap and element settings, 
+                            unchanged netlists are loaded from it 
+                            instead of being parsed. See spatk.cache.
+    uid_scheme (str, func): "md5" (default), "int", "location" or a 
+                            custom uid function. See helpers.uid_scheme().
+    backend (str):          Storage of the elements, "dict" (default) or
+                            "table" for the columnar ElementTable, which
+                            builds elements on first access and runs 
+                            the bulk operations on integer arrays. 
+                            See spatk.table.
 
     Description
     ----------------
@@ -68,40 +625,139 @@ class Circuit:
                 element_settings=[],
                 syntax="generic",
                 is_filename=True, 
-                keep_comments=False):
-        if netlist:
-            if is_filename:
-                self.name = netlist
-                self._netlist = read_netlist(netlist, keep_comments)
-            else:
-                self.name = "Netlist"
-                self._netlist = clean_netlist(netlist, keep_comments)
-        else:
-            self.name = "Netlist"
-            self._netlist = []
-
+                keep_comments=False,
+                use_mmap=False,
+                workers=None,
+                lazy=False,
+                resolve_includes=False,
+                search_paths=[],
+                cache_dir=None,
+                uid_scheme="md5",
+                backend="dict"):
+        if backend not in ("dict", "table"):
+            raise ValueError("Unknown backend: {}".format(backend))
         if elementmap:
             self.elementmap = elementmap
         else:
-            if syntax == "ngspice":
-                self.elementmap = ngspice_map
-            elif syntax == "xyce":
-                self.elementmap = xyce_map
-            elif syntax == "hspice":
-                self.elementmap = hspice_map
-            else:
-                self.elementmap = generic_map
+            self.elementmap = elementmaps.get(syntax, generic_map)
+        self.linetypes = LinetypeTable(self.elementmap)
         self.element_settings = element_settings
-        self.parsed_circuit = self.parse(self._netlist)
-        self.circuit = copy.deepcopy(self.parsed_circuit)
+        self.backend = backend
+        self.lazy = lazy or backend == "table"
+        lazy = self.lazy
+        # Every distinct net name is kept once, see net_id().
+        self.nets = InternTable()
+        self._net_index = None
+        self._name_index = None
+        self._type_index = None
+        self._location_index = None
+        self._numeric_index = dict()
+        self._hierarchy_index = None
+        # Rendered netlist lines by uid, see _synthesize().
+        self._rendered = dict()
+        self._owner = Owner(self)
+        self.uid_scheme = uid_scheme
+        self._uid = get_uid_scheme(uid_scheme)
+
+        self.filename = None
+        self.name = "Netlist"
+        if netlist and is_filename:
+            self.name = netlist
+            self.filename = netlist
+
+        # parsed_circuit holds the immutable element records from which
+        # the elements are (re)built, see reset().
+        self.parsed_circuit = None
+        self.circuit = None
+        if netlist and cache_dir:
+            if callable(uid_scheme):
+                scheme = "{}.{}".format(uid_scheme.__module__, 
+                                        uid_scheme.__qualname__)
+            else:
+                scheme = uid_scheme
+            key = cache.cache_key(netlist, 
+                                  is_filename, 
+                                  self.elementmap, 
+                                  self.element_settings,
+                                  keep_comments=keep_comments,
+                                  uid_scheme=scheme)
+            self.parsed_circuit = cache.load(cache_dir, key)
+
+        if self.parsed_circuit is None:
+            if netlist:
+                if (is_filename and use_mmap and not compression(netlist)
+                        and not (workers and workers > 1)):
+                    # Parse while reading, the cleaned lines are never 
+                    # held as a list.
+                    lines = mmap_lines(netlist, keep_comments)
+                    self._netlist = clean_lines(lines, keep_comments)
+                elif is_filename:
+                    self._netlist = read_netlist(netlist, keep_comments, use_mmap)
+                else:
+                    self._netlist = clean_netlist(netlist, keep_comments)
+            else:
+                self._netlist = []
+            self.parsed_circuit, self.circuit = self._parse(self._netlist, 
+                                                            workers, 
+                                                            lazy)
+            if netlist and cache_dir:
+                cache.store(cache_dir, key, self.parsed_circuit)
+        if self.circuit is None and backend == "table":
+            self.circuit = ElementTable(self.elementmap, 
+                                        self.element_settings, 
+                                        self.nets,
+                                        self)
+            self.circuit.extend(dict.items(self.parsed_circuit))
+        elif self.circuit is None:
+            self.circuit = self.parsed_circuit.copy(owner=self)
+            if not lazy:
+                self.circuit = dict(self.circuit.items())
+        elif not lazy:
+            for element in self.circuit.values():
+                self._adopt(element)
+        if not self.lazy:
+            self._index_nets()
+            self._index_names()
+        if isinstance(self._uid, IntUid):
+            self._uid.next = max(self.parsed_circuit, default=-1) + 1
+        # Line number of the next appended element, see append().
+        self._next_n = 0
+        if self.parsed_circuit:
+            last = next(reversed(self.parsed_circuit))
+            self._next_n = self.parsed_circuit.raw(last)[4] + 1
         self._synthesize()
         self._asign_attributes()
+        self.includes = dict()
+        if resolve_includes:
+            self.resolve_includes(search_paths)
 
     def _asign_attributes(self):
+        # Element types are live views, see __getattr__ and ElementView.
+        self._types = dict()
         for elem in self.elementmap.values():
             if elem:
                 elemname = (elem.__name__).lower()
-                setattr(self, "{}s".format(elemname), self._attr(elem))
+                self._types["{}s".format(elemname)] = ElementView(self, elem)
+
+    def __getattr__(self, name):
+        types = self.__dict__.get("_types")
+        if types and name in types:
+            return types[name]
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+                             self.__class__.__name__, name))
+
+
+    def __setstate__(self, state):
+        # Copies and pickles of the elements lose their owner (see 
+        # Owner), they are adopted again by the copy of the Circuit.
+        self.__dict__.update(state)
+        self._owner = Owner(self)
+        if isinstance(self.circuit, (LazyElements, ElementTable)):
+            self.circuit.owner = self
+        for uid in self.circuit:
+            element = self._raw(uid)
+            if type(element) is not tuple:
+                self._adopt(element)
 
 
     def __str__(self):
@@ -115,7 +771,43 @@ class Circuit:
         return self.circuit
 
     def __setitem__(self, key, item):
+        # An element reports its changes to one Circuit, an element
+        # that already belongs to one is assigned as a copy.
+        if item._owner is not None and self._raw(key) is not item:
+            item = copy.deepcopy(item)
+        old = ()
+        old_keys = (None, None)
+        if key in self.circuit:
+            old = self._nets_of(key)
+            if self._name_index is not None:
+                old_keys = self._name_keys(key)
+            if self._type_index is not None:
+                self._type_index.update(key, self._class_of(key), type(item))
+            if self._location_index is not None:
+                self._location_index.update(key, self._location_of(key), 
+                                            item.location)
+            if self._numeric_index:
+                self._remove_numbers(key)
+        else:
+            if self._net_index is not None:
+                self._net_index.add(key, ())
+            if self._type_index is not None:
+                self._type_index.add(key, type(item))
+            if self._location_index is not None:
+                self._location_index.add(key, item.location)
+        # Changes of the element are reported by its uid.
+        item.uid = key
+        self._adopt(item)
+        self._rendered.pop(key, None)
         self.circuit[key] = item
+        if self._net_index is not None:
+            self._net_index.update(key, old, item.nets)
+        if self._numeric_index:
+            self._update_numbers(key, item)
+        if self._hierarchy_index is not None:
+            self._update_hierarchy(key)
+        if self._name_index is not None:
+            self._update_names(key, old_keys, self._element_keys(item))
 
     def __getitem__(self, key):
         return self.circuit[key]
@@ -123,12 +815,236 @@ class Circuit:
     def __iter__(self):
         return iter(self.circuit.keys())
 
-    def _attr(self, elemtype):
-        values = []
+    def _adopt(self, element):
+        """ Intern the nets of element and notify self of its changes. """
+        element.intern_nets(self.nets.canonical)
+        element._owner = self._owner
+        args = getattr(element, "argsdata", None)
+        if isinstance(args, Args):
+            args.watch(element)
+        tokens = getattr(element, "elements", None)
+        if type(tokens) is list:
+            element._elements = Tokens(tokens, element)
+        if type(element._value) is list:
+            element._value = Tokens(element._value, element)
+        self._rendered.pop(element.uid, None)
+
+    def _element_changed(self, element, attr, old):
+        """ Update the indexes after attr of element changed. """
+        # Elements that were replaced or deleted are ignored.
+        if self._raw(element.uid) is not element:
+            return
+        self._rendered.pop(element.uid, None)
+        if attr == "ports" and self._net_index is not None:
+            self._net_index.update(element.uid, old, element.nets)
+        if attr == "location" and self._location_index is not None:
+            self._location_index.update(element.uid, old, element.location)
+        if attr in ("value", "args") and self._numeric_index:
+            self._update_numbers(element.uid, element)
+        if (attr in ("value", "elements", "line", "location") and 
+            self._hierarchy_index is not None and 
+            isinstance(element, (Subckt, SubcktDef))):
+            self._update_hierarchy(element.uid)
+        if (attr in ("instance", "location", "name") and 
+            self._name_index is not None):
+            location = element.location
+            instance = element.instance
+            name = element.name if element.type == "param" else None
+            if attr == "location":
+                location = old
+            elif attr == "instance":
+                instance = old
+            else:
+                name = old
+            self._update_names(element.uid, 
+                               self._keys(location, instance, name), 
+                               self._element_keys(element))
+
+    def _raw(self, uid):
+        """ Element or record of uid without building the element. """
+        if uid not in self.circuit:
+            return None
+        if isinstance(self.circuit, (LazyElements, ElementTable)):
+            return self.circuit.raw(uid)
+        return self.circuit[uid]
+
+    def _class_of(self, uid):
+        """ Element class of uid without building the element. """
+        element = self._raw(uid)
+        if type(element) is tuple:
+            return self.elementmap[element[1]]
+        return type(element)
+
+    def _types_index(self):
+        """ Index of the element classes, built on first use. """
+        if self._type_index is None:
+            index = TypeIndex()
+            if isinstance(self.circuit, (LazyElements, ElementTable)):
+                for uid in self.circuit:
+                    index.add(uid, self._class_of(uid))
+            else:
+                for uid, element in self.circuit.items():
+                    index.add(uid, type(element))
+            self._type_index = index
+        return self._type_index
+
+    def _location_of(self, uid):
+        """ Location of uid without building the element. """
+        element = self._raw(uid)
+        if type(element) is tuple:
+            return element[2]
+        return element.location
+
+    def _locations_index(self):
+        """ Index of the element locations, built on first use. """
+        if self._location_index is None:
+            index = BucketIndex()
+            for uid in self.circuit:
+                index.add(uid, self._location_of(uid))
+            self._location_index = index
+        return self._location_index
+
+    def _numbers_index(self, elemtype, key):
+        """ Index of the numbers key of elemtype, built on first use. """
+        fields = self._numeric_index.setdefault(elemtype, dict())
+        index = fields.get(key)
+        if index is None:
+            index = fields[key] = NumericIndex()
+            types = self._types_index()
+            for cls, bucket in types.buckets.items():
+                if cls.__name__.lower() == elemtype:
+                    index.extend((uid, self._number(self.circuit[uid], key), seq)
+                                 for uid, seq in bucket.items())
+        return index
+
+    def _number(self, element, key):
+        try:
+            return spice_number(field(element, key))
+        except AttributeError:
+            return None
+
+    def _update_numbers(self, uid, element):
+        fields = self._numeric_index.get(element.type)
+        if fields:
+            seq = self._type_index.buckets[type(element)][uid]
+            for key, index in fields.items():
+                index.update(uid, self._number(element, key), seq)
+
+    def _remove_numbers(self, uid):
+        fields = self._numeric_index.get(self._class_of(uid).__name__.lower())
+        if fields:
+            for index in fields.values():
+                index.remove(uid)
+
+    def _hierarchy_entry(self, uid):
+        """ Entry of uid in the hierarchy index, see HierarchyIndex. """
+        cls = self._class_of(uid)
+        if issubclass(cls, SubcktDef):
+            element = self.circuit[uid]
+            return ("subckt", element.name, element.location)
+        if issubclass(cls, Subckt):
+            element = self.circuit[uid]
+            nets, name, params = self._subckt_call(element)
+            return ("instance", name, element.location)
+        return None
+
+    def _subckt_call(self, element):
+        """ (nets, subcircuit name, parameters) of an instance (X). 
+
+        The name is the last token before the parameters, which start 
+        at "params:" or the first "key=value" token.
+        """
+        tokens = element.elements
+        end = len(tokens)
+        for i in range(1, len(tokens)):
+            if tokens[i].lower() == "params:" or "=" in tokens[i]:
+                end = i
+                break
+        return tokens[1:end-1], tokens[end-1], tokens[end:]
+
+    def _update_hierarchy(self, uid):
+        entry = None
+        seq = None
+        if uid in self.circuit:
+            entry = self._hierarchy_entry(uid)
+            if entry is not None:
+                seq = self._type_index.buckets[self._class_of(uid)][uid]
+        self._hierarchy_index.update(uid, entry, seq)
+
+    def _hierarchy(self):
+        """ Index of the subcircuits, built on first use. """
+        if self._hierarchy_index is None:
+            types = self._types_index()
+            self._hierarchy_index = HierarchyIndex()
+            for uid in types.select(lambda cls: issubclass(cls, (Subckt, SubcktDef))):
+                self._update_hierarchy(uid)
+        return self._hierarchy_index
+
+    def _nets_of(self, uid):
+        if isinstance(self.circuit, ElementTable):
+            return self.circuit.nets_of(uid)
+        return self.circuit[uid].nets
+
+    def _index_nets(self):
+        """ Build the net to uids index, see net_uids(). """
+        index = NetIndex()
+        if isinstance(self.circuit, ElementTable):
+            for uid in self.circuit:
+                index.add(uid, self.circuit.nets_of(uid))
+        else:
+            for uid, element in self.circuit.items():
+                index.add(uid, element.nets)
+        self._net_index = index
+        return index
+
+    def _nets_index(self):
+        if self._net_index is None:
+            return self._index_nets()
+        return self._net_index
+
+    def _keys(self, location, instance, name):
+        """ (location, instance) and (location, param name) keys. """
+        if instance is not None:
+            instance = (location, instance)
+        if name is not None:
+            name = (location, name)
+        return instance, name
+
+    def _element_keys(self, element):
+        if element.type == "param":
+            return self._keys(element.location, element.instance, element.name)
+        return self._keys(element.location, element.instance, None)
+
+    def _name_keys(self, uid):
+        """ Index keys of uid, see _keys(). """
+        if isinstance(self.circuit, ElementTable):
+            record = self.circuit.raw(uid)
+            if (type(record) is tuple and 
+                self.elementmap[record[1]].__name__.lower() != "param"):
+                instance = self.circuit.attribute(uid, "instance")
+                return self._keys(record[2], instance, None)
+        return self._element_keys(self.circuit[uid])
+
+    def _update_names(self, uid, old, new):
+        instances, params = self._name_index
+        instances.update(uid, old[0], new[0])
+        params.update(uid, old[1], new[1])
+
+    def _index_names(self):
+        """ Build the instance and parameter indexes, see instance_uid(). """
+        self._name_index = (NameIndex(), NameIndex())
         for uid in self.circuit:
-            if isinstance(self.circuit[uid], elemtype):
-                values.append(self.circuit[uid])
-        return values
+            self._update_names(uid, (None, None), self._name_keys(uid))
+        return self._name_index
+
+    def _position(self, uid):
+        """ Position of uid in circuit order, see BucketIndex. """
+        return self._types_index().buckets[self._class_of(uid)][uid]
+
+    def _names_index(self):
+        if self._name_index is None:
+            return self._index_names()
+        return self._name_index
 
 
     @property
@@ -138,88 +1054,233 @@ class Circuit:
         return "".join(self._netlist)
 
 
-    def reset(self):
-        """ Reset the Circuit to the initially parsed Circuit. """
-        self.circuit = copy.deepcopy(self.parsed_circuit)
-
+    def resolve_includes(self, search_paths=[], active=None):
+        """ Resolve .include and .lib statements recursively.
 
-    def parse(self, netlist):
-        """ Parse the string netlist into a circuit representation.
+        Optional inputs:
+        ----------------
+        search_paths (list):    Directories searched for included 
+                                files after the directory of the 
+                                netlist.
+        active (set):           Files that are being resolved, used 
+                                to break include cycles.
 
-        Required inputs:
+        Returns
         ----------------
-        netlist (str, list):    SPICE netlist.
+        includes (dict):        The included Circuits by uid of the
+                                including statement.
 
 
+        Description
+        ----------------
+        Files are loaded through load_include(), so every file and 
+        library section is only parsed once per process and shared 
+        between all Circuits that include it.
+        """
+        if self.filename:
+            directory = os.path.dirname(os.path.abspath(self.filename))
+        else:
+            directory = os.getcwd()
+        directories = [directory, *search_paths]
+        for uid in self.circuit:
+            if isinstance(self.circuit, (LazyElements, ElementTable)):
+                record = self.circuit.raw(uid)
+                if (type(record) is tuple and not 
+                    issubclass(self.elementmap[record[1]], (Include, Library))):
+                    continue
+            element = self.circuit[uid]
+            if isinstance(element, Include):
+                section = None
+            elif isinstance(element, Library) and element.filename:
+                section = element.libname
+            else:
+                continue
+            path = find_include(element.filename, directories)
+            included = load_include(path, 
+                                    section, 
+                                    self.elementmap, 
+                                    self.element_settings,
+                                    search_paths,
+                                    active)
+            if included:
+                self.includes[uid] = included
+        return self.includes
+
+
+    def included(self):
+        """ Iterate over all recursively included Circuits.
+
         Returns
         ----------------
-        elements (dict):        dict of circuit elements. Where
-                                the key is the uid (unique id).
+        circuits (iter):    Every included Circuit once, depth first.
         """
+        seen = set()
+        stack = list(reversed(self.includes.values()))
+        while stack:
+            cir = stack.pop()
+            if id(cir) in seen:
+                continue
+            seen.add(id(cir))
+            yield cir
+            stack.extend(reversed(cir.includes.values()))
 
-        elements = dict()
-        ctlsec = False
-        hierarchy = collections.deque()
-        hierarchy.append("/")
-        library = None
 
-        regex_nreq          = re.compile(r"^$|^\.end$")
-        reqex_subckt_s      = re.compile(r"^.subckt*")
-        reqex_subckt_e      = re.compile(r"^.ends.*")
-        reqex_control_s     = re.compile(r"^.control")
-        reqex_control_e     = re.compile(r"^.endc")
-        reqex_library_def_s = re.compile(r"^.lib [a-zA-Z0-9_.-]*$") 
-        reqex_library_def_e = re.compile(r"^.endl.*")
+    def reset(self):
+        """ Reset the Circuit to the initially parsed Circuit. 
+
+        Description
+        ----------------
+        Elements are rebuilt from the parsed records only if they 
+        were changed, deleted or never built. Unchanged elements 
+        are kept as they are.
+        """
+        if self.backend == "table":
+            circuit = ElementTable(self.elementmap, 
+                                   self.element_settings, 
+                                   self.nets,
+                                   self)
+            for uid in self.parsed_circuit:
+                record = self.parsed_circuit.raw(uid)
+                element = None
+                if uid in self.circuit:
+                    element = self.circuit.raw(uid)
+                if (type(element) is not tuple and 
+                    self._unchanged(uid, element, record)):
+                    circuit[uid] = element
+                else:
+                    circuit.add_record(uid, record)
+            self.circuit = circuit
+            self._net_index = None
+            self._name_index = None
+            self._type_index = None
+            self._location_index = None
+            self._numeric_index = dict()
+            self._hierarchy_index = None
+            self._rendered = dict()
+            return
+        if self.lazy:
+            circuit = LazyElements(self.elementmap, 
+                                   self.element_settings, 
+                                   owner=self)
+        else:
+            circuit = dict()
+        for uid in self.parsed_circuit:
+            record = self.parsed_circuit.raw(uid)
+            if isinstance(self.circuit, LazyElements):
+                element = dict.get(self.circuit, uid)
+            else:
+                element = self.circuit.get(uid)
+            if element is record or self._unchanged(uid, element, record):
+                dict.__setitem__(circuit, uid, element)
+            elif self.lazy:
+                dict.__setitem__(circuit, uid, record)
+            else:
+                circuit[uid] = self.parsed_circuit[uid]
+                self._adopt(circuit[uid])
+        self.circuit = circuit
+        self._net_index = None
+        self._name_index = None
+        self._type_index = None
+        self._location_index = None
+        self._numeric_index = dict()
+        self._hierarchy_index = None
+        self._rendered = dict()
+        if not self.lazy:
+            self._index_nets()
+            self._index_names()
+
+
+    def _unchanged(self, uid, element, record):
+        """ Check if an element still matches its parsed record. """
+        line, elemtype, location, library, n = record
+        return (type(element) is self.elementmap[elemtype] and
+                element.uid == uid and 
+                element.location == location and
+                element.lib == library and
+                element.n == n and
+                str(element) == line)
+
+
+    def parse(self, netlist, workers=None, lazy=False):
+        """ Parse the string netlist into a circuit representation.
 
-        n = 0
+        Required inputs:
+        ----------------
+        netlist (str, list):    SPICE netlist.
 
-        if isinstance(netlist, str):
-            netlist = [netlist]
 
-        for line in netlist:
+        Optional inputs:
+        ----------------
+        workers (int):          Number of worker processes. 
+        lazy (bool):            Only parse the element records and
+                                build the elements on first access.
 
-            if not re.match(regex_nreq, line):
 
-                if re.match(reqex_subckt_s, line):
-                    hierarchy.append(line.split(" ")[1])
+        Returns
+        ----------------
+        elements (dict):        dict of circuit elements. Where
+                                the key is the uid (unique id).
+                                A LazyElements dict if lazy is set.
 
-                if re.match(reqex_library_def_s, line):
-                    library = line.split(" ")[1]
 
-                if re.match(reqex_control_s, line) or ctlsec:
-                    ctlsec = True
-                    if re.match(reqex_control_e, line):
-                        ctlsec = False
-                else:
-                    elemtype = map_linetype(line, self.elementmap)
-                    if len(hierarchy) == 1:
-                        location = hierarchy[0]
-                    else:
-                        location = "/".join(hierarchy)[1:]
-                    cls = self.elementmap[elemtype].__name__
-                    if cls in self.element_settings:
-                        settings = self.element_settings[cls]
-                    else:
-                        settings = []
-                    if elemtype ==  ".PARAM":
-                        lines = dissect_param(line)
-                        for line in lines:
-                            uid = get_uid(line, n)
-                            element = self.elementmap[elemtype]
-                            elements[uid] = element(line, location, library, n, uid, settings)
-                    else:
-                        uid = get_uid(line, n)
-                        element = self.elementmap[elemtype]
-                        elements[uid] = element(line, location, library, n, uid, settings)
+        Description
+        ----------------
+        With workers the netlist is split at top level subcircuit
+        and library boundaries (see split_netlist()) and the chunks 
+        are parsed in a process pool. The result is identical to
+        the serial parse. Custom elementmaps need to be picklable.
+        """
+        records, elements = self._parse(netlist, workers, lazy)
+        if lazy:
+            return records.copy()
+        return elements
 
-                if re.match(reqex_subckt_e, line):
-                    hierarchy.pop()
 
-                if re.match(reqex_library_def_e, line):
-                    library = None
+    def _parse(self, netlist, workers=None, lazy=False, offset=0):
+        """ Parse into records and (unless lazy) elements.
 
-            n = n + 1;
-        return elements
+        Returns
+        ----------------
+        records (LazyElements): Immutable records of the elements.
+        elements (dict):        dict of circuit elements, None if 
+                                lazy is set.
+        """
+        records = LazyElements(self.elementmap, self.element_settings, False)
+        if lazy:
+            elements = None
+        else:
+            elements = dict()
+        if workers and workers > 1 and not isinstance(netlist, str):
+            chunks = [(offset, lines, self.elementmap, 
+                       self.element_settings, self.linetypes, lazy, self._uid)
+                      for offset, lines in split_netlist(netlist, 4*workers)]
+            # Integer uids depend on all preceding elements.
+            renumber = isinstance(self._uid, IntUid)
+            if len(chunks) > 1:
+                with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                    for parsed in executor.map(_parse_chunk, chunks):
+                        for uid, record, element in parsed:
+                            if renumber:
+                                uid = self._uid(record[0], record[4], record[2], 0)
+                                if element:
+                                    element.uid = uid
+                            records[uid] = record
+                            if not lazy:
+                                elements[uid] = element
+                return records, elements
+
+        for uid, record in parse_records(netlist, 
+                                         self.elementmap,
+                                         offset,
+                                         self.linetypes,
+                                         self._uid):
+            records[uid] = record
+            if not lazy:
+                elements[uid] = build_element(uid, 
+                                              record, 
+                                              self.elementmap, 
+                                              self.element_settings)
+        return records, elements
 
 
     def _synthesize(self):
@@ -230,13 +1291,38 @@ class Circuit:
         Reverse of parse(). It generates a netlist from a the
         internal Circuit representation.
 
+        The rendered line of every element is kept until the element
+        changes, i.e. its value, ports, args, netlist tokens (elements),
+        line, instance, location or settings are set, it is replaced or
+        deleted. Only those elements are rendered again.
+
+        Elements of a lazy Circuit that have not been built yet are
+        written out verbatim, unless element settings apply to them.
         """
         netlist = [ "* {}\n\n".format(self.name) ]
-        for uid in self.circuit:
-            netlist.append("{}\n".format(self.circuit[uid]))
+        netlist.extend(self._lines())
         self._netlist = netlist
 
 
+    def _lines(self):
+        """ Iterate over the rendered netlist lines of the elements. """
+        rendered = self._rendered
+        for uid in self.circuit:
+            line = rendered.get(uid)
+            if line is None:
+                line = rendered[uid] = self._render(uid)
+            yield line
+
+
+    def _render(self, uid):
+        """ Netlist line of uid. """
+        element = self._raw(uid)
+        if (type(element) is tuple and 
+            self.elementmap[element[1]].__name__ not in self.element_settings):
+            return "{}\n".format(element[0])
+        return "{}\n".format(self.circuit[uid])
+
+
     def append(self, line):
         """ Append an element to the Circuit.
 
@@ -245,17 +1331,39 @@ class Circuit:
         line (str):     SPICE netlist line.
         """
         line = clean_netlist(line)
-        parsed = self.parse(line)
-        last = list(self.circuit.keys())[-1]
-        if last:
-            n = self.circuit[last].n + 1
+        # Parsed with the line numbers they get in the circuit, so
+        # that the uids are the same as for a parsed netlist. Line 
+        # numbers are never handed out twice, even after elements
+        # were deleted or replaced.
+        n = self._next_n
+        lazy = isinstance(self.circuit, ElementTable)
+        records, elements = self._parse(line, lazy=lazy, offset=n)
+        self._next_n = n + len(line)
+        for uid in records:
+            if uid in self.circuit:
+                raise ValueError("uid already in the Circuit: {}".format(uid))
+        if lazy:
+            self.circuit.extend(dict.items(records))
+            uids = list(records)
         else:
-            n = 0
-        for i, uid_parsed in enumerate(parsed):
-            uid = get_uid(parsed[uid_parsed].line, i)
-            parsed[uid_parsed].n = n + i
-            self.circuit[uid] = parsed[uid_parsed]
-        self._asign_attributes()
+            for uid in elements:
+                self._adopt(elements[uid])
+                self.circuit[uid] = elements[uid]
+            uids = list(elements)
+        for uid in uids:
+            if self._net_index is not None:
+                self._net_index.add(uid, self._nets_of(uid))
+            if self._name_index is not None:
+                self._update_names(uid, (None, None), self._name_keys(uid))
+            if self._type_index is not None:
+                self._type_index.add(uid, self._class_of(uid))
+            if self._location_index is not None:
+                self._location_index.add(uid, self._location_of(uid))
+            if (self._numeric_index and 
+                self._class_of(uid).__name__.lower() in self._numeric_index):
+                self._update_numbers(uid, self.circuit[uid])
+            if self._hierarchy_index is not None:
+                self._update_hierarchy(uid)
 
 
     def write(self, filename):
@@ -263,11 +1371,357 @@ class Circuit:
 
         Optional inputs:
         ----------------
-        filename (str):     Name of the output file.
+        filename (str):     Name of the output file. Files ending 
+                            in .gz, .bz2, .xz or .lzma are compressed.
+
+        Returns
+        ----------------
+        size (int):         Number of bytes written, see write_to().
+        """
+        with open_netlist(filename, "w") as ofile:
+            return self.write_to(ofile)
+
+
+    def write_to(self, fileobj, chunk_size=16384):
+        """ Write the netlist to a file object.
+
+        Required inputs:
+        ----------------
+        fileobj (file):     Text or binary file object, binary files
+                            are written in UTF-8.
+
+
+        Optional inputs:
+        ----------------
+        chunk_size (int):   Number of lines written per call.
+
+        Returns
+        ----------------
+        size (int):         Number of bytes written, before any 
+                            compression.
+
+
+        Description
+        ----------------
+        The output is the same as netlist with a header comment of
+        the time it was written. The lines are rendered one after the
+        other (see _synthesize()) and written in chunks, the netlist 
+        is never held in memory as a whole.
         """
-        with open(filename, "w") as ofile:
-            ofile.write("* Netlist written: {}\n".format(datetime.datetime.now()))
-            ofile.write(self.netlist)
+        return write_chunks(fileobj, 
+                            itertools.chain([netlist_header(self.name)], 
+                                            self._lines()), 
+                            chunk_size)
+
+
+    def compile_template(self, fields):
+        """ Compile the netlist into a Template with variable fields.
+
+        Required inputs:
+        ----------------
+        fields (list):          Fields that stay variable, either 
+                                (uid, key) of an element property like
+                                "value" or argument like "w", or the
+                                name of a top level parameter (.param).
+
+        Returns
+        ----------------
+        template (Template):    Template rendering the netlist with new
+                                values of fields, e.g.
+
+                                    template.render({"wmin": "2u",
+                                                     (uid, "w"): "3u"})
+
+
+        Description
+        ----------------
+        Everything but the fields is rendered once into a few chunks 
+        of text, see spatk.template.Template. The Template is a 
+        snapshot, later changes of the Circuit do not affect it.
+        """
+        keys = dict()
+        for name in fields:
+            if isinstance(name, str):
+                uid = self.param_uid(name)
+                if uid is None:
+                    raise ValueError("Unknown parameter: {}".format(name))
+                key = "value"
+            else:
+                uid, key = name
+                if uid not in self.circuit:
+                    raise ValueError("Unknown uid: {}".format(uid))
+            keys.setdefault(uid, dict())[name] = key
+        self._synthesize()
+        parts = []
+        positions = dict()
+        text = [self._netlist[0]]
+        for uid, line in zip(self.circuit, self._netlist[1:]):
+            if uid not in keys:
+                text.append(line)
+                continue
+            element = self.circuit[uid]
+            variable = copy.deepcopy(element)
+            defaults = []
+            for i, (name, key) in enumerate(keys[uid].items()):
+                sentinel = "\0{}\0".format(i)
+                try:
+                    defaults.append(str(field(element, key)))
+                    if hasattr(variable, key):
+                        setattr(variable, key, sentinel)
+                    else:
+                        variable.args[key] = sentinel
+                except AttributeError:
+                    raise ValueError("Unknown field: {}".format(name)) from None
+            pieces = re.split("\0([0-9]+)\0", "{}\n".format(variable))
+            names = list(keys[uid])
+            if sorted(pieces[1::2]) != sorted(str(i) for i in range(len(names))):
+                raise ValueError("Fields are not in the netlist: {}".format(names))
+            text.append(pieces[0])
+            for i, chunk in zip(pieces[1::2], pieces[2::2]):
+                i = int(i)
+                parts.append("".join(text))
+                positions[names[i]] = len(parts)
+                parts.append(defaults[i])
+                text = [chunk]
+        parts.append("".join(text))
+        return Template(parts, positions)
+
+
+    def flatten(self, filename=None, sep="."):
+        """ Flatten the subcircuit hierarchy.
+
+        Optional inputs:
+        ----------------
+        filename (str):     Write the flat netlist to this file instead 
+                            of returning a Circuit, see write().
+        sep (str):          Separator of the hierarchical names.
+
+        Returns
+        ----------------
+        circuit (Circuit):  The flat netlist, parsed with the settings 
+                            of this Circuit, if filename is None.
+        size (int):         Number of bytes written otherwise.
+
+
+        Description
+        ----------------
+        Every subcircuit instance (X) is replaced by the elements of 
+        its definition. The instances are named by their path through
+        the hierarchy behind their type prefix, like SPICE does, e.g. 
+        "m3" in "x2" in "x1" becomes "m.x1.x2.m3" and "xm3" becomes 
+        "xm.x1.x2.xm3" where "XM" is a mosfet. The ports of the 
+        definition are replaced by the nets of the instance, internal
+        nets get the path as prefix, e.g. "x1.x2.n1". Net 0 and the
+        nets of .global statements are kept.
+
+        Statements inside of the definitions, e.g. .model or .param, 
+        are written once. Parameters are not evaluated: instances 
+        passing parameters (x1 a b inv w=2u) raise a ValueError, 
+        default parameters of definitions (params: w=1u) are ignored 
+        and expressions using them are written as they are. 
+        Subcircuit definitions are looked up like subckt_uid(). A 
+        definition that instantiates itself raises a ValueError.
+
+        Only elements with known ports can be flattened. Elements 
+        whose ports are not parsed, e.g. behavioral sources (B), 
+        XSPICE models (A) or numerical devices (N), raise a 
+        ValueError inside of a subcircuit. Their nets can also be 
+        referenced in expressions like v(a), which are not rewritten.
+
+        The hierarchy is expanded without recursion. Each definition 
+        is compiled into Templates once (see compile_template()) 
+        which are rendered for every instance. With a filename the 
+        flat netlist is written in chunks as it is expanded and is 
+        never held in memory as a whole.
+        """
+        lines = self._flat_lines(sep)
+        if filename is None:
+            return Circuit("".join(lines), 
+                           elementmap=self.elementmap,
+                           element_settings=self.element_settings,
+                           is_filename=False,
+                           lazy=self.lazy,
+                           uid_scheme=self.uid_scheme,
+                           backend=self.backend)
+        # The lines are rendered runs of many elements, fewer of them
+        # are joined per write.
+        with open_netlist(filename, "w") as ofile:
+            return write_chunks(ofile, 
+                                itertools.chain([netlist_header(self.name)], 
+                                                lines), 
+                                256)
+
+
+    def _flat_lines(self, sep):
+        """ Iterate over the lines of the flat netlist, see flatten(). """
+        keep = {"0"}
+        for uid in self._types_index().uids(Global):
+            keep.update(self.circuit[uid].elements[1:])
+        top = []
+        for uid in self._locations_index().get("/"):
+            if issubclass(self._class_of(uid), Subckt):
+                top.append(self._flat_instance(uid, "/", [], keep))
+            else:
+                top.append(self._rendered.get(uid) or self._render(uid))
+        bodies = dict()
+        # Items, hierarchical path, nets of the ports and definitions
+        # of every instance being expanded.
+        stack = [(iter(top), "", (), ())]
+        while stack:
+            items, path, nets, chain = stack[-1]
+            for item in items:
+                if type(item) is str:
+                    yield item
+                elif item[0] == "template":
+                    template, sources = item[1:]
+                    values = dict()
+                    for i, (kind, arg) in sources.items():
+                        if kind == "name":
+                            prefix, name = arg
+                            values[i] = "{}{}{}{}{}".format(prefix, sep, 
+                                                            path, sep, name)
+                        elif kind == "port":
+                            values[i] = nets[arg]
+                        else:
+                            values[i] = "{}{}{}".format(path, sep, arg)
+                    yield template.render(values)
+                else:
+                    instance, uid, ports = item[1:]
+                    if uid in chain:
+                        raise ValueError("Recursive subcircuit: {}".format(
+                                         self.circuit[uid].name))
+                    body = bodies.get(uid)
+                    if body is None:
+                        body, statements = self._flat_body(uid, keep)
+                        bodies[uid] = body
+                        yield from statements
+                    subnets = []
+                    for kind, arg in ports:
+                        if kind == "port":
+                            subnets.append(nets[arg])
+                        elif kind == "net":
+                            subnets.append("{}{}{}".format(path, sep, arg))
+                        else:
+                            subnets.append(arg)
+                    if path:
+                        instance = "{}{}{}".format(path, sep, instance)
+                    stack.append((iter(body), instance, subnets, chain + (uid,)))
+                    break
+            else:
+                stack.pop()
+
+
+    def _flat_instance(self, uid, location, ports, keep):
+        """ Expansion of the subcircuit instance uid, see _flat_lines(). """
+        element = self.circuit[uid]
+        nets, name, params = self._subckt_call(element)
+        if params:
+            raise ValueError("Cannot flatten an instance with parameters: "
+                             "{}".format(element))
+        definition = self._hierarchy().resolve(name, location)
+        if definition is None:
+            raise ValueError("Unknown subcircuit: {}".format(name))
+        if len(nets) != len(self._flat_ports(definition)):
+            raise ValueError("Wrong number of ports: {}".format(element))
+        sources = []
+        for net in nets:
+            if net in ports:
+                sources.append(("port", ports.index(net)))
+            elif net in keep or location == "/":
+                sources.append(("keep", net))
+            else:
+                sources.append(("net", net))
+        return ("instance", element.instance, definition, sources)
+
+
+    def _flat_name(self, instance):
+        """ (prefix, instance), prefix is the element type of instance. """
+        prefix = self.linetypes.lookup(instance)
+        if prefix is None:
+            return (instance[0], instance)
+        return (prefix.lower(), instance)
+
+
+    def _flat_ports(self, uid):
+        """ Ports of the subcircuit definition uid. """
+        ports = []
+        for token in self.circuit[uid].elements[2:]:
+            if token.lower() == "params:" or "=" in token:
+                break
+            ports.append(token)
+        return ports
+
+
+    def _flat_body(self, uid, keep):
+        """ Compile the definition uid for _flat_lines().
+
+        Returns the items of the body, runs of elements compiled into 
+        Templates and instances, and the statements of the body.
+        """
+        path = self._location_of(uid)
+        ports = self._flat_ports(uid)
+        items = []
+        statements = []
+        parts = []
+        positions = dict()
+        sources = dict()
+        text = []
+        def flush():
+            if text or parts:
+                parts.append("".join(text))
+                items.append(("template", 
+                              Template(parts.copy(), positions.copy()), 
+                              sources.copy()))
+                for collected in (parts, positions, sources, text):
+                    collected.clear()
+        for body in self._locations_index().get(path):
+            if body == uid:
+                continue
+            if issubclass(self._class_of(body), Subckt):
+                flush()
+                items.append(self._flat_instance(body, path, ports, keep))
+                continue
+            element = self.circuit[body]
+            if isinstance(element, (Statement, Comment)):
+                line = self._rendered.get(body) or self._render(body)
+                if not re.match(reqex_subckt_e, line):
+                    statements.append(line)
+                continue
+            if not isinstance(element, Component):
+                raise ValueError("Cannot flatten {} without known ports: "
+                                 "{}".format(element.type, element))
+            variable = copy.deepcopy(element)
+            fields = dict()
+            def sentinel(kind, arg):
+                i = len(sources) + len(fields)
+                fields[i] = (kind, arg)
+                return "\0{}\0".format(i)
+            variable.instance = sentinel("name", 
+                                         self._flat_name(element.instance))
+            if isinstance(getattr(variable, "vname", None), str):
+                variable.vname = sentinel("name", 
+                                          self._flat_name(element.vname))
+            nets = []
+            for net in element.nets:
+                if net in ports:
+                    net = sentinel("port", ports.index(net))
+                elif net not in keep:
+                    net = sentinel("net", net)
+                nets.append(net)
+            variable.ports = nets
+            pieces = re.split("\0([0-9]+)\0", "{}\n".format(variable))
+            if sorted(int(i) for i in pieces[1::2]) != sorted(fields):
+                raise ValueError("Cannot flatten: {}".format(element))
+            text.append(pieces[0])
+            for i, chunk in zip(pieces[1::2], pieces[2::2]):
+                i = int(i)
+                parts.append("".join(text))
+                positions[i] = len(parts)
+                parts.append("")
+                sources[i] = fields[i]
+                text[:] = [chunk]
+        flush()
+        return items, statements
 
 
     def filter(self, key, val, uids=[]):
@@ -289,8 +1743,342 @@ class Circuit:
         uids (list):        List of uid's that matches the
                             criteria.
 
+
+        Description
+        ----------------
+        Same as query([(key, "~", val)], uids), see query().
+        """
+        if (isinstance(self.circuit, ElementTable) and 
+            self.circuit._column(key) is not None):
+            return self.circuit.filter(key, val, uids)
+        return self.query([(key, "~", val)], uids)
+
+
+    def query(self, predicates, uids=[]):
+        """ Find circuit elements matching several predicates.
+
+        Required inputs:
+        ----------------
+        predicates (list, Query):   (key, operator, value) tuples or 
+                                    a compiled Query, e.g. 
+                                    [("type", "==", "mosfet"),
+                                     ("model", "~", "nch.*"),
+                                     ("location", "under", "/core")].
+
+
+        Optional inputs:
+        ----------------
+        uids (list):                List of preselected circuit element
+                                    uids (unique id's).
+
+        Returns
+        ----------------
+        uids (list):                List of uid's that match all 
+                                    predicates, in circuit order or 
+                                    the order of uids.
+
+
+        Description
+        ----------------
+        See spatk.query.Query for the operators. The predicates are 
+        compiled once. Predicates on the type, location and nets 
+        select the candidates from the type, location and net indexes 
+        of the Circuit, each of them only checked once per element 
+        class, location or net. The remaining predicates are then 
+        evaluated in a single pass over the candidates.
+        """
+        if not isinstance(predicates, Query):
+            predicates = Query(predicates)
+        return self._select(predicates, uids)
+
+
+    def _select(self, query, uids=[]):
+        """ uids matching the compiled query, see query(). """
+        selected = []
+        if query.types:
+            selected.append(self._types_index().select(query.match_type))
+        if query.locations:
+            selected.append(self._locations_index().select(query.match_location))
+        for expr in query.nets:
+            selected.append(dict.fromkeys(self._nets_index().match(expr)))
+        if uids:
+            candidates = uids
+        elif selected:
+            selected.sort(key=len)
+            candidates = selected.pop(0)
+        else:
+            candidates = self.circuit
+        for other in selected:
+            other = set(other)
+            candidates = [uid for uid in candidates if uid in other]
+        circuit = self.circuit
+        if not query.tests:
+            return [uid for uid in candidates if uid in circuit]
+        if isinstance(circuit, ElementTable):
+            get = self._getter()
+            return [uid for uid in candidates 
+                    if uid in circuit and query.match(uid, get)]
+        return [uid for uid in candidates 
+                if uid in circuit and query.match(circuit[uid])]
+
+
+    def _getter(self):
+        """ get(uid, key) reading the property or argument key of uid.
+
+        Type, location and nets, as well as the table columns, are 
+        read without building the element.
+        """
+        circuit = self.circuit
+        if isinstance(circuit, ElementTable):
+            def get(uid, key):
+                if key == "nets":
+                    return circuit.nets_of(uid)
+                if circuit._column(key) is not None:
+                    return circuit.attribute(uid, key)
+                return field(circuit[uid], key)
+        elif isinstance(circuit, LazyElements):
+            def get(uid, key):
+                if key == "type":
+                    return self._class_of(uid).__name__.lower()
+                if key == "location":
+                    return self._location_of(uid)
+                return field(circuit[uid], key)
+        else:
+            def get(uid, key):
+                return field(circuit[uid], key)
+        return get
+
+
+    def group_by(self, keys, aggregates=["count"], where=None):
+        """ Aggregate circuit elements by groups.
+
+        Required inputs:
+        ----------------
+        keys (str, list):       Property or argument to group by, e.g. 
+                                "type", "location" or "model", or a 
+                                list of them. "nets" groups every 
+                                element once per port by its net.
+
+
+        Optional inputs:
+        ----------------
+        aggregates (list):      "count" and (operator, key) tuples 
+                                with the operators "count", "sum", 
+                                "min" and "max" of the numbers of key, 
+                                e.g. ("sum", "w").
+        where (list, Query):    Predicates the elements have to match,
+                                see query().
+
+        Returns
+        ----------------
+        groups (dict):          The aggregates by group, where the 
+                                group is the value of keys (a tuple 
+                                for a list of keys). The aggregates 
+                                are a dict by "count" and 
+                                "<operator>_<key>", e.g. "sum_w".
+
+
+        Description
+        ----------------
+        Elements without one of the keys are not grouped, properties
+        and arguments that are no number (see helpers.spice_number()) 
+        are not aggregated. A sum without any number is 0, the 
+        minimum and maximum are None.
+
+        The elements are selected like query() from the type, 
+        location and net indexes and aggregated in a single pass.
+        Counts by type, location or net alone are read from the sizes
+        of the indexes. element_types() and count_nets() are special 
+        cases, e.g.
+
+            cir.group_by(["model", "location"], 
+                         ["count", ("sum", "w")], 
+                         [("type", "==", "mosfet")])
+
+        counts the mosfets and sums up their width by model and 
+        location.
+        """
+        operations = []
+        for aggregate in aggregates:
+            if aggregate == "count":
+                operations.append(("count", None, "count"))
+                continue
+            try:
+                op, key = aggregate
+            except (TypeError, ValueError):
+                raise ValueError("Unknown aggregate: {}".format(aggregate))
+            if op not in ("count", "sum", "min", "max"):
+                raise ValueError("Unknown aggregate: {}".format(aggregate))
+            operations.append((op, key, "{}_{}".format(op, key)))
+        single = isinstance(keys, str)
+        if single:
+            keys = [keys]
+        keys = list(keys)
+        if (where is None and len(keys) == 1 and 
+            all(key is None for op, key, name in operations)):
+            counts = self._group_counts(keys[0])
+            if counts is not None:
+                groups = dict()
+                for group, count in counts.items():
+                    if not single:
+                        group = (group,)
+                    groups[group] = {name: count for op, key, name in operations}
+                return groups
+
+        if where is None:
+            candidates = self.circuit
+        else:
+            if not isinstance(where, Query):
+                where = Query(where)
+            candidates = self._select(where)
+        get = self._getter()
+        numbers = dict()
+        groups = dict()
+        for uid in candidates:
+            try:
+                values = [get(uid, key) for key in keys]
+            except AttributeError:
+                continue
+            row = []
+            for op, key, name in operations:
+                number = None
+                if key is not None:
+                    try:
+                        val = get(uid, key)
+                    except AttributeError:
+                        val = None
+                    try:
+                        number = numbers[val]
+                    except (KeyError, TypeError):
+                        number = spice_number(val)
+                        if type(val) is str:
+                            numbers[val] = number
+                row.append(number)
+            if "nets" in keys:
+                values = [val if key == "nets" else (val,)
+                          for key, val in zip(keys, values)]
+                combinations = itertools.product(*values)
+            else:
+                combinations = [values]
+            for values in combinations:
+                if single:
+                    group = values[0]
+                else:
+                    group = tuple(values)
+                aggregated = groups.get(group)
+                if aggregated is None:
+                    aggregated = groups[group] = dict()
+                    for op, key, name in operations:
+                        if op == "count":
+                            aggregated[name] = 0
+                        elif op == "sum":
+                            aggregated[name] = 0.0
+                        else:
+                            aggregated[name] = None
+                for (op, key, name), number in zip(operations, row):
+                    if op == "count":
+                        if key is None or number is not None:
+                            aggregated[name] = aggregated[name] + 1
+                    elif number is None:
+                        continue
+                    elif op == "sum":
+                        aggregated[name] = aggregated[name] + number
+                    elif op == "min":
+                        if aggregated[name] is None or number < aggregated[name]:
+                            aggregated[name] = number
+                    elif aggregated[name] is None or number > aggregated[name]:
+                        aggregated[name] = number
+        return groups
+
+
+    def _group_counts(self, key):
+        """ Counts by type, location or net from the indexes. """
+        counts = dict()
+        if key == "type":
+            for cls, bucket in self._types_index().buckets.items():
+                name = cls.__name__.lower()
+                counts[name] = counts.get(name, 0) + len(bucket)
+        elif key == "location":
+            for location, bucket in self._locations_index().buckets.items():
+                counts[location] = len(bucket)
+        elif key == "nets":
+            for net, uids in self._nets_index().nets.items():
+                counts[net] = sum(uids.values())
+        else:
+            return None
+        return counts
+
+
+    def range(self, elemtype, key, low=None, high=None, inclusive="both"):
+        """ Find circuit elements by a numeric range.
+
+        Required inputs:
+        ----------------
+        elemtype (str):     Element type, e.g. "mosfet".
+        key (str):          Property or argument, e.g. "value" or "w".
+
+
+        Optional inputs:
+        ----------------
+        low (str, float):   Lower bound, a SPICE number like "10u".
+        high (str, float):  Upper bound, a SPICE number like "1m".
+        inclusive (str):    Bounds that are included: "both" 
+                            (default), "neither", "left" or "right".
+
+        Returns
+        ----------------
+        uids (list):        List of uid's with low <= key <= high in 
+                            ascending order of key.
+
+
+        Description
+        ----------------
+        Values are compared as numbers with their SPICE scale factors,
+        see helpers.spice_number(). Elements where key is no number, 
+        e.g. an expression, never match. 
+
+        Each (elemtype, key) is kept in a sorted index that is built 
+        on first use and updated by changes of the element values and 
+        arguments, append(), delete() and item assignment, so a lookup
+        is a bisection of the index.
+        """
+        bounds = []
+        for bound in (low, high):
+            if bound is not None:
+                number = spice_number(bound)
+                if number is None:
+                    raise ValueError("Not a number: {}".format(bound))
+                bound = number
+            bounds.append(bound)
+        index = self._numbers_index(elemtype, key)
+        return index.range(*bounds, inclusive)
+
+
+    def top(self, elemtype, key, k, largest=True):
+        """ Find the circuit elements with the largest numbers.
+
+        Required inputs:
+        ----------------
+        elemtype (str):     Element type, e.g. "capacitor".
+        key (str):          Property or argument, e.g. "value" or "w".
+        k (int):            Number of elements.
+
+
+        Optional inputs:
+        ----------------
+        largest (bool):     Find the smallest numbers instead if False.
+
+        Returns
+        ----------------
+        uids (list):        List of up to k uid's, largest first (or
+                            smallest first).
+
+
+        Description
+        ----------------
+        Runs on the same index as range().
         """
-        return filter(self.circuit, key, val, uids)
+        return self._numbers_index(elemtype, key).top(k, largest)
 
 
     def apply(self, func, uids, **kwargs):
@@ -309,7 +2097,7 @@ class Circuit:
         """
         for uid in uids:
             element = self.circuit[uid]
-            self.circuit[uid] = func(element, **kwargs)
+            self[uid] = func(element, **kwargs)
 
 
     def touches(self, expr):
@@ -323,9 +2111,40 @@ class Circuit:
         Returns
         ----------------
         uids (list):    List of uid's that matches the
-                        criteria.
+                        criteria, once for every matching port.
+
+
+        Description
+        ----------------
+        Runs on the net index, see net_uids(), so expr is only 
+        matched against every distinct net name once.
+        """
+        return self._nets_index().match(expr)
+
+
+    def net_uids(self, net):
+        """ Find circuit elements connected to a net.
+
+        Required inputs:
+        ----------------
+        net (str):      name of the net.
+
+
+        Returns
+        ----------------
+        uids (list):    List of uid's in circuit order, once for
+                        every port on the net.
+
+
+        Description
+        ----------------
+        The Circuit keeps an index from nets to elements. It is 
+        built when the netlist is parsed (on first use for a lazy 
+        Circuit or the table backend) and kept up to date by append(), delete(), apply(),
+        item assignment and changes of the element ports, so the 
+        lookup only costs the number of ports on the net.
         """
-        return touches(self.circuit, expr)
+        return self._nets_index().uids(net)
 
 
     def count_nets(self):
@@ -335,7 +2154,9 @@ class Circuit:
         ----------------
         nets(dict): dictionary with net, count pairs.
         """
-        return count_nets(self.circuit)
+        if isinstance(self.circuit, ElementTable):
+            return self.circuit.count_nets()
+        return {net: counts["count"] for net, counts in self.group_by("nets").items()}
 
 
     def element_types(self):
@@ -345,7 +2166,63 @@ class Circuit:
         ----------------
         elements (set): set of element types in circuit.
         """
-        return element_types(self.circuit)
+        if isinstance(self.circuit, ElementTable):
+            return self.circuit.element_types()
+        return set(self.group_by("type"))
+
+
+    def net_id(self, name):
+        """ Get the integer id of a net.
+
+        Required inputs:
+        ----------------
+        name (str):     name of the net.
+
+
+        Returns
+        ----------------
+        id (int):       id of the net, None if no port was ever 
+                        connected to it.
+
+
+        Description
+        ----------------
+        Each distinct net name is kept once in the net table 
+        Circuit.nets, the id is its position in there. Ids stay 
+        valid when elements are deleted. In a lazy Circuit nets are 
+        added as the elements are built.
+        """
+        return self.nets.id(name)
+
+
+    def net_name(self, id):
+        """ Get the name of a net by its id.
+
+        Required inputs:
+        ----------------
+        id (int):       id of the net, see net_id().
+
+
+        Returns
+        ----------------
+        name (str):     name of the net.
+        """
+        return self.nets.name(id)
+
+
+    def port_ids(self, uid):
+        """ Get the net ids of the ports of an element.
+
+        Required inputs:
+        ----------------
+        uid (str):      uid of the element.
+
+
+        Returns
+        ----------------
+        ids (tuple):    net ids in port order.
+        """
+        return tuple(self.nets.intern(net) for net in self.circuit[uid].nets)
 
 
     def instance_uid(self, instance, loc="/"):
@@ -364,11 +2241,39 @@ class Circuit:
         Returns
         ----------------
         uid (str):       uid of the instance.
+
+
+        Description
+        ----------------
+        Looked up in an index by location and instance name that 
+        is kept up to date by append(), delete(), item assignment 
+        and renames of the elements.
         """
-        for uid in self.circuit:
-            if (self.circuit[uid].instance == instance and 
-                self.circuit[uid].location == loc ):
-                return uid
+        instances, params = self._names_index()
+        return instances.first((loc, instance), self._position)
+
+
+    def instance_uids(self, instances, loc="/"):
+        """ Get the uids of many instances.
+
+        Required inputs:
+        ----------------
+        instances (list):   names of the instances.
+
+
+        Optional inputs:
+        ----------------
+        loc (str):          location where the instances are located
+                            in the hierachy.
+
+        Returns
+        ----------------
+        uids (list):        uid of each instance, None if there is
+                            no such instance.
+        """
+        first = self._names_index()[0].first
+        return [first((loc, instance), self._position) 
+                for instance in instances]
 
 
     def param_uid(self, param, loc="/"):
@@ -387,12 +2292,162 @@ class Circuit:
         Returns
         ----------------
         uid (str):    uid of the parameter.
+
+
+        Description
+        ----------------
+        Looked up in an index like instance_uid().
         """
-        for uid in self.circuit:
-            if self.circuit[uid].type == "param":
-                if (self.circuit[uid].name ==  param and 
-                    self.circuit[uid].location == loc ):
-                    return uid
+        instances, params = self._names_index()
+        return params.first((loc, param), self._position)
+
+
+    def param_uids(self, params, loc="/"):
+        """ Get the uids of many parameters (.param).
+
+        Required inputs:
+        ----------------
+        params (list):  names of the parameters.
+
+
+        Optional inputs:
+        ----------------
+        loc (str):      location where the parameters are located
+                        in the hierachy.
+
+        Returns
+        ----------------
+        uids (list):    uid of each parameter, None if there is
+                        no such parameter.
+        """
+        first = self._names_index()[1].first
+        return [first((loc, param), self._position) for param in params]
+
+
+    def subckt_uid(self, name, loc="/"):
+        """ Get uid of a subcircuit definition (.subckt).
+
+        Required inputs:
+        ----------------
+        name (str):     name of the subcircuit.
+
+
+        Optional inputs:
+        ----------------
+        loc (str):      location the subcircuit is used from
+                        in the hierachy.
+
+        Returns
+        ----------------
+        uid (str):      uid of the definition, None if there is
+                        no such subcircuit.
+
+
+        Description
+        ----------------
+        The definition is resolved like SPICE does for an instance
+        at loc: subcircuits defined inside loc first, then those of 
+        the enclosing subcircuits up to the top level.
+
+        Looked up in an index of the subcircuit definitions and 
+        instances that is built on first use and kept up to date by
+        append(), delete(), item assignment and renames of the 
+        elements.
+        """
+        return self._hierarchy().resolve(name, loc)
+
+
+    def subckt_body(self, name, loc="/"):
+        """ Get the uids of the body of a subcircuit definition.
+
+        Required inputs:
+        ----------------
+        name (str):     name of the subcircuit.
+
+
+        Optional inputs:
+        ----------------
+        loc (str):      location the subcircuit is used from, 
+                        see subckt_uid().
+
+        Returns
+        ----------------
+        uids (list):    uids from the .subckt to the .ends line
+                        in circuit order, including subcircuits 
+                        defined inside it. Empty if there is no 
+                        such subcircuit.
+        """
+        uid = self.subckt_uid(name, loc)
+        if uid is None:
+            return []
+        path = self._location_of(uid)
+        prefix = path + "/"
+        return self._locations_index().select(
+            lambda location: location == path or location.startswith(prefix))
+
+
+    def subckt_instances(self, name, loc=None):
+        """ Get the uids of the instances (X) of a subcircuit.
+
+        Required inputs:
+        ----------------
+        name (str):     name of the subcircuit.
+
+
+        Optional inputs:
+        ----------------
+        loc (str):      only the instances placed at this location
+                        in the hierachy.
+
+        Returns
+        ----------------
+        uids (list):    uids of the instances in circuit order.
+        """
+        index = self._hierarchy()
+        uids = index.uids(name)
+        if loc is not None:
+            uids = [uid for uid in uids if index.entries[uid][2] == loc]
+        return uids
+
+
+    def subckt_children(self, name=None, loc="/"):
+        """ Get the subcircuits instantiated by a subcircuit.
+
+        Optional inputs:
+        ----------------
+        name (str):     name of the subcircuit, the top level
+                        if None.
+        loc (str):      location the subcircuit is used from, 
+                        see subckt_uid().
+
+        Returns
+        ----------------
+        children (dict):    Number of instances by subcircuit name.
+        """
+        index = self._hierarchy()
+        path = "/"
+        if name is not None:
+            uid = index.resolve(name, loc)
+            if uid is None:
+                return dict()
+            path = index.entries[uid][2]
+        return dict(index.children.get(path, {}))
+
+
+    def subckt_parents(self, name):
+        """ Get the places a subcircuit is instantiated at.
+
+        Required inputs:
+        ----------------
+        name (str):     name of the subcircuit.
+
+        Returns
+        ----------------
+        parents (dict):     Number of instances by the location they 
+                            are placed at, "/" for the top level and
+                            e.g. "/amp" inside the subcircuit amp.
+        """
+        return self._hierarchy().parents(name)
 
 
     def delete(self, uids):
@@ -402,8 +2457,22 @@ class Circuit:
         ----------------
         uid (str, list):  uid(s) of the element(s) to delete.
         """
-        if isinstance(uids, str):
+        if (isinstance(uids, (str, int)) or 
+            (isinstance(uids, tuple) and uids in self.circuit)):
             uids = [uids]
         for uid in uids:
             if uid in self.circuit.keys():
+                if self._net_index is not None:
+                    self._net_index.remove(uid, self._nets_of(uid))
+                if self._name_index is not None:
+                    self._update_names(uid, self._name_keys(uid), (None, None))
+                if self._type_index is not None:
+                    self._type_index.remove(uid, self._class_of(uid))
+                if self._location_index is not None:
+                    self._location_index.remove(uid, self._location_of(uid))
+                if self._numeric_index:
+                    self._remove_numbers(uid)
+                self._rendered.pop(uid, None)
                 del self.circuit[uid]
+                if self._hierarchy_index is not None:
+                    self._hierarchy_index.update(uid, None)
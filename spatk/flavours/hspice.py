@@ -53,6 +53,8 @@ from spatk.genelems import (Args,
 
 class Temp(Statement):
     """ .temp Statement. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Temp, self).__init__(*args)
 
@@ -62,7 +64,10 @@ class Temp(Statement):
 
     @value.setter
     def value(self, arg):
+        old = self.elements[1]
         self.elements[1] = str(arg)
+        if self._owner is not None:
+            self._changed("value", old)
 
 
 #----------------------------------------------------------------------
@@ -58,6 +58,8 @@ from spatk.genelems import (Args,
 
 class Temp(Statement):
     """ .temp Statement. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Temp, self).__init__(*args)
 
@@ -67,17 +69,24 @@ class Temp(Statement):
 
     @value.setter
     def value(self, arg):
+        old = self.elements[1]
         self.elements[1] = str(arg)
+        if self._owner is not None:
+            self._changed("value", old)
 
 
 class Xspice(Default):
     """ A - Xspice Element. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Xspice, self).__init__(*args)
 
 
 class Isource(Component_2T):
     """ I - Current Source. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Isource, self).__init__(*args)
 
@@ -109,6 +118,8 @@ class Isource(Component_2T):
 
 class Numerical_device_gss(Default):
     """ N - Numerical Device for GSS. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Numerical_device_gss, self).__init__(*args)
 
@@ -116,6 +127,8 @@ class Numerical_device_gss(Default):
 
 class Vsource(Component_2T):
     """ V - Voltage Source. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Vsource, self).__init__(*args)
 
@@ -147,6 +160,8 @@ class Vsource(Component_2T):
 
 class Single_lossy_transmission_line(Component_4T):
     """ Y - Single Lossy Transmission Line. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Single_lossy_transmission_line, self).__init__(*args)
 
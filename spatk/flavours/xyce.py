@@ -58,6 +58,8 @@ from spatk.genelems import (Args,
 
 class Option(Statement):
     """ .option Statement. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Option, self).__init__(*args)
 
@@ -84,12 +86,16 @@ class Option(Statement):
 
     @value.setter
     def value(self, arg):
-        s = self.elements[2].split("=", 1)[0]
-        self.elements[2] = "{}={}".format(s, arg)
+        s = self.elements[2].split("=", 1)
+        self.elements[2] = "{}={}".format(s[0], arg)
+        if self._owner is not None:
+            self._changed("value", s[-1])
 
 
 class Print(Statement):
     """ .print Statement. """
+    __slots__ = ("kwargidx", "_argsdata")
+
     def __init__(self, *args):
         super(Print, self).__init__(*args)
         self.kwargidx = 2
@@ -130,10 +136,13 @@ class Print(Statement):
 
     @value.setter
     def value(self, arg):
+        old = self.value
         if isinstance(arg, str):
             self.elements[self.kwargidx+1:] = arg.split(" ")
         elif isinstance(arg, list): 
             self.elements[self.kwargidx+1:] = arg
+        if self._owner is not None:
+            self._changed("value", old)
 
 
 #----------------------------------------------------------------------
@@ -20,26 +20,213 @@ from spatk.helpers import unpack_args, repack_args
 # Generic Element Classes
 #----------------------------------------------------------------------
 class Args(dict):
-    def __init__(self, data):
+    """ Element arguments, accessible as items or attributes.
+
+    Required inputs:
+    ----------------
+    data (list, dict): "key=value" tokens or a mapping of them.
 
-        if isinstance(data, list):
-            _data = unpack_args(data)
 
-        super().__init__(_data)
+    Description
+    ----------------
+    Changes are reported to the element watching the arguments, 
+    see watch().
+    """
+    __slots__ = ("_element",)
 
-        for k in _data.keys():
-            setattr(self, k, _data[k])
+    def __init__(self, data=()):
+        if isinstance(data, list):
+            data = unpack_args(data)
+        super(Args, self).__init__(data)
+        object.__setattr__(self, "_element", None)
 
     def __str__(self):
-        return " ".join(repack_args(self.__dict__))
+        return " ".join(repack_args(self))
+
+    def __reduce__(self):
+        return (Args, (dict(self),))
+
+    def watch(self, element):
+        """ Report changes to element. """
+        object.__setattr__(self, "_element", element)
+
+    def _changed(self):
+        if self._element is not None:
+            self._element._changed("args", None)
+
+    def __setitem__(self, key, value):
+        super(Args, self).__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super(Args, self).__delitem__(key)
+        self._changed()
+
+    def update(self, *args, **kwargs):
+        super(Args, self).update(*args, **kwargs)
+        self._changed()
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, *args):
+        value = super(Args, self).pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super(Args, self).popitem()
+        self._changed()
+        return item
+
+    def clear(self):
+        super(Args, self).clear()
+        self._changed()
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key) from None
 
     def __setattr__(self, key, value):
-        super().__setattr__(key, value)
-        super().__setitem__(key, value)
+        self[key] = value
+
+    def __delattr__(self, key):
+        try:
+            del self[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+
+class Tokens(list):
+    """ Netlist tokens of an element.
+
+    Required inputs:
+    ----------------
+    tokens (list):      The tokens.
+    element (Default):  Element the changes are reported to.
+    """
+    __slots__ = ("_element",)
+
+    def __init__(self, tokens=(), element=None):
+        super(Tokens, self).__init__(tokens)
+        self._element = element
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+    def _changed(self):
+        if self._element is not None:
+            self._element._changed("elements", None)
+
+    def __setitem__(self, key, value):
+        super(Tokens, self).__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super(Tokens, self).__delitem__(key)
+        self._changed()
+
+    def __iadd__(self, other):
+        super(Tokens, self).__iadd__(other)
+        self._changed()
+        return self
+
+    def __imul__(self, n):
+        super(Tokens, self).__imul__(n)
+        self._changed()
+        return self
+
+    def append(self, token):
+        super(Tokens, self).append(token)
+        self._changed()
+
+    def extend(self, tokens):
+        super(Tokens, self).extend(tokens)
+        self._changed()
+
+    def insert(self, i, token):
+        super(Tokens, self).insert(i, token)
+        self._changed()
+
+    def pop(self, *args):
+        token = super(Tokens, self).pop(*args)
+        self._changed()
+        return token
+
+    def remove(self, token):
+        super(Tokens, self).remove(token)
+        self._changed()
+
+    def clear(self):
+        super(Tokens, self).clear()
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        super(Tokens, self).sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        super(Tokens, self).reverse()
+        self._changed()
+
+
+class Ports(dict):
+    """ Dictionary view on the port tuple of an element.
+
+    The view maps "n0", "n1", ... onto the nets of the element and
+    writes any change through to the element it was taken from.
+
+    Required inputs:
+    ----------------
+    element (Default): element owning the ports.
+    """
+    __slots__ = ("_element",)
+
+    def __init__(self, element):
+        super(Ports, self).__init__(("n"+str(i), p) for i,p in enumerate(element._ports))
+        self._element = element
 
     def __setitem__(self, key, value):
-        super().__setitem__(key, value)
-        super().__setattr__(key, value)
+        super(Ports, self).__setitem__(key, value)
+        self._element.ports = self.values()
+
+    def __delitem__(self, key):
+        super(Ports, self).__delitem__(key)
+        self._element.ports = self.values()
+
+    def update(self, *args, **kwargs):
+        super(Ports, self).update(*args, **kwargs)
+        self._element.ports = self.values()
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class Owner():
+    """ Reference from the elements to the Circuit owning them.
+
+    Required inputs:
+    ----------------
+    circuit (Circuit):  Circuit owning the elements.
+
+
+    Description
+    ----------------
+    Copies and pickles of an element do not belong to any Circuit,
+    the reference is therefore copied and pickled as None.
+    """
+    __slots__ = ("circuit",)
+
+    def __init__(self, circuit):
+        self.circuit = circuit
+
+    def __reduce__(self):
+        return (type(None), ())
 
 
 class Default():
@@ -53,30 +240,75 @@ class Default():
     uid (str):       unique identifier for this element.
     settings (dict): element specific settings.
     """
+    __slots__ = ("_line", "_location", "lib", "uid", "n", "_instance",
+                 "_ports", "_value", "settings", "_owner")
+
     def __init__(self, line, location, lib, n, uid, settings):
+        self._owner = None
         self.line = line
-        self.location = location
+        self._location = location
         self.lib = lib
         self.uid = uid
         self.n = n
-        self.instance = None
-        self.ports = dict()
+        self._instance = None
+        self._ports = ()
         self._value = None
         self.settings = settings
 
     def __str__(self):
         return self.line
 
+    def _changed(self, attr, old):
+        """ Notify the owning Circuit that attr changed from old. """
+        if self._owner is not None:
+            self._owner.circuit._element_changed(self, attr, old)
+
     def parse(self, line):
         pass
 
     def apply_settings(self, settings):
         pass
 
+    def intern_nets(self, intern):
+        """ Replace every port net name by intern(name). """
+        self._ports = tuple(intern(net) for net in self._ports)
+
+    @property
+    def line(self):
+        return self._line
+
+    @line.setter
+    def line(self, arg):
+        self._line = arg
+        if self._owner is not None:
+            self._changed("line", None)
+
     @property
     def type(self):
         return (self.__class__.__name__).lower()
 
+    @property
+    def location(self):
+        return self._location
+
+    @location.setter
+    def location(self, arg):
+        old = self._location
+        self._location = arg
+        if self._owner is not None:
+            self._changed("location", old)
+
+    @property
+    def instance(self):
+        return self._instance
+
+    @instance.setter
+    def instance(self, arg):
+        old = self._instance
+        self._instance = arg
+        if self._owner is not None:
+            self._changed("instance", old)
+
     @property
     def parent(self):
         if self.location != "/":
@@ -86,28 +318,90 @@ class Default():
             else:
                 return parent
 
+    @property
+    def ports(self):
+        return Ports(self)
+
+    @ports.setter
+    def ports(self, arg):
+        if isinstance(arg, dict):
+            arg = arg.values()
+        old = self._ports
+        self._ports = tuple(arg)
+        if self._owner is not None:
+            self._changed("ports", old)
+
+    @property
+    def nets(self):
+        return self._ports
+
     @property
     def value(self):
         return self._value
 
     @value.setter
     def value(self, arg):
+        old = self._value
+        if self._owner is not None and type(arg) is list:
+            arg = Tokens(arg, self)
         self._value = arg
+        if self._owner is not None:
+            self._changed("value", old)
+
+    @property
+    def elements(self):
+        return self._elements
+
+    @elements.setter
+    def elements(self, arg):
+        if self._owner is not None:
+            self._elements = Tokens(arg, self)
+            self._changed("elements", None)
+        else:
+            self._elements = arg
+
+    @property
+    def argsdata(self):
+        return self._argsdata
+
+    @argsdata.setter
+    def argsdata(self, arg):
+        self._argsdata = arg
+        if self._owner is not None:
+            if isinstance(arg, Args):
+                arg.watch(self)
+            self._changed("args", None)
 
 
 class Component(Default):
     """ Generic Component Element Class. """
+    __slots__ = ("_elements", "_argsdata")
+
     def __init__(self, *args):
         super(Component, self).__init__(*args)
-        self.elements = self.line.split(" ")
         self.instance = self.elements[0]
+        self.argsdata = None
         self.parse(self.elements)
 
     def __str__(self):
         return " ".join(self.elements)
 
     def _assign_ports(self, elements):
-        return {"n"+str(i): p for i,p in enumerate(elements)}
+        return tuple(elements)
+
+    def intern_nets(self, intern):
+        """ Replace every port net name by intern(name). """
+        nets = {id(net): intern(net) for net in self._ports}
+        self.elements = [nets.get(id(token), token) for token in self.elements]
+        self._ports = tuple(nets[id(net)] for net in self._ports)
+
+    @property
+    def line(self):
+        return " ".join(self.elements)
+
+    @line.setter
+    def line(self, arg):
+        self.elements = arg.split(" ")
 
     @property
     def args(self):
@@ -120,6 +414,8 @@ class Component(Default):
 
 class Component_2T(Component):
     """ Component with two terminals. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Component_2T, self).__init__(*args)
 
@@ -130,7 +426,7 @@ class Component_2T(Component):
 
     def __str__(self):
         l = [self.instance,
-             *self.ports.values(),
+             *self._ports,
              self.value]
         if self.args:
             l.append(str(self.argsdata))
@@ -139,6 +435,8 @@ class Component_2T(Component):
 
 class Component_3T(Component):
     """ Component with three terminals. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Component_3T, self).__init__(*args)
 
@@ -149,7 +447,7 @@ class Component_3T(Component):
 
     def __str__(self):
         l = [self.instance,
-             *self.ports.values(),
+             *self._ports,
              self.value]
         if self.args:
             l.append(str(self.argsdata))
@@ -158,6 +456,8 @@ class Component_3T(Component):
 
 class Component_4T(Component):
     """ Component with four terminals. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Component_4T, self).__init__(*args)
 
@@ -168,7 +468,7 @@ class Component_4T(Component):
 
     def __str__(self):
         l = [self.instance,
-             *self.ports.values(),
+             *self._ports,
              self.value]
         if self.args:
             l.append(str(self.argsdata))
@@ -177,16 +477,27 @@ class Component_4T(Component):
 
 class Statement(Default):
     """ Generic Spice statement Class"""
+    __slots__ = ("_elements",)
+
     def __init__(self, *args):
         super(Statement, self).__init__(*args)
-        self.elements = self.line.split(" ")
 
     def __str__(self):
         return " ".join(self.elements)
 
+    @property
+    def line(self):
+        return " ".join(self.elements)
+
+    @line.setter
+    def line(self, arg):
+        self.elements = arg.split(" ")
+
 
 class Comment(Default):
     """ Comment. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Comment, self).__init__(*args)
 
@@ -196,6 +507,8 @@ class Comment(Default):
 
 class Model(Statement):
     """ .model Statement. """
+    __slots__ = ("_argsdata", "expanded", "sorted", "order")
+
     def __init__(self, *args):
         super(Model, self).__init__(*args)
         self.argsdata = Args(self.elements[3:])
@@ -216,6 +529,8 @@ class Model(Statement):
             self.sorted=False
         else:
             self.order=False
+        if self._owner is not None:
+            self._changed("settings", None)
 
     def __str__(self):
         l = [".model",
@@ -224,10 +539,10 @@ class Model(Statement):
         if self.args:
             if self.order:    
                 d = dict(sorted(
-                    self.args.__dict__.items(), 
+                    self.args.items(), 
                     key=lambda item: self.order.get(item[0], len(self.settings["order"]))))
             else:
-                d = self.args.__dict__
+                d = self.args
             if self.expanded:
                 l.append("\n+")
                 l.append("\n+ ".join(repack_args(d, self.sorted)))
@@ -262,6 +577,8 @@ class Model(Statement):
 
 class Subckt(Component):
     """ X - Subcircuit. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Subckt, self).__init__(*args)
 
@@ -271,7 +588,10 @@ class Subckt(Component):
 
     @value.setter
     def value(self, arg):
+        old = self.elements[-1]
         self.elements[-1] = arg
+        if self._owner is not None:
+            self._changed("value", old)
 
     @property
     def name(self):
@@ -284,6 +604,8 @@ class Subckt(Component):
 
 class SubcktDef(Statement):
     """ .subckt Statement. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(SubcktDef, self).__init__(*args)
 
@@ -293,7 +615,10 @@ class SubcktDef(Statement):
 
     @value.setter
     def value(self, arg):
+        old = self.elements[1]
         self.elements[1] = arg
+        if self._owner is not None:
+            self._changed("value", old)
 
     @property
     def name(self):
@@ -306,6 +631,8 @@ class SubcktDef(Statement):
 
 class Include(Statement):
     """ .include Statement. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Include, self).__init__(*args)
 
@@ -320,6 +647,8 @@ class Include(Statement):
 
 class Library(Statement):
     """ .lib Statement. """
+    __slots__ = ("_hasfilename",)
+
     def __init__(self, *args):
         super(Library, self).__init__(*args)
         if len(self.elements) == 2:
@@ -356,6 +685,8 @@ class Library(Statement):
 
 class LibraryEnd(Statement):
     """ .endl Statement. """
+    __slots__ = ("_haslibname", "newline", "noname")
+
     def __init__(self, *args):
         super(LibraryEnd, self).__init__(*args)
         if len(self.elements) == 1:
@@ -374,6 +705,8 @@ class LibraryEnd(Statement):
             self.noname = True
         else:
             self.noname = False
+        if self._owner is not None:
+            self._changed("settings", None)
 
     def __str__(self):
         if self.newline:
@@ -400,6 +733,8 @@ class LibraryEnd(Statement):
 
 class Param(Statement):
     """ .param Statement. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Param, self).__init__(*args)
 
@@ -411,6 +746,8 @@ class Param(Statement):
     def value(self, arg):
         s = self.elements[1].split("=", 1)
         self.elements[1] = "{}={}".format(s[0], arg)
+        if self._owner is not None:
+            self._changed("value", s[1])
 
     @property
     def name(self):
@@ -420,35 +757,47 @@ class Param(Statement):
     def name(self, arg):
         s = self.elements[1].split("=", 1)
         self.elements[1] = "{}={}".format(arg, s[1])
+        if self._owner is not None:
+            self._changed("name", s[0])
 
 
 
 class Option(Statement):
     """ .option Statement. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Option, self).__init__(*args)
 
 
 class Function(Statement):
     """ .func Statement. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Function, self).__init__(*args)
 
 
 class Global(Statement):
     """ .global Statement. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Global, self).__init__(*args)
 
 
 class Behavioral_source(Default):
     """ B - Behavioral Source. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Behavioral_source, self).__init__(*args)
 
 
 class Capacitor(Component_2T):
     """ C - Capacitor. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Capacitor, self).__init__(*args)
 
@@ -463,6 +812,8 @@ class Capacitor(Component_2T):
 
 class Inductor(Component_2T):
     """ L - Inductor. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Inductor, self).__init__(*args)
 
@@ -477,6 +828,8 @@ class Inductor(Component_2T):
 
 class Resistor(Component_2T):
     """ R - Resistor. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Resistor, self).__init__(*args)
 
@@ -491,6 +844,8 @@ class Resistor(Component_2T):
 
 class Diode(Component_2T):
     """ D - Diode. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Diode, self).__init__(*args)
 
@@ -505,18 +860,24 @@ class Diode(Component_2T):
 
 class Vcvs(Component_4T):
     """ E - Voltage Controlled Voltage Source. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Vcvs, self).__init__(*args)
 
 
 class Vccs(Component_4T):
     """ G - Voltage Controlled Current Source. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Vccs, self).__init__(*args)
 
 
 class Cccs(Component_2T):
     """ F - Current Controlled Current Source. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Cccs, self).__init__(*args)
 
@@ -536,7 +897,7 @@ class Cccs(Component_2T):
 
     def __str__(self):
         l = [self.instance,
-             *self.ports.values(),
+             *self._ports,
              self.vname,
              self.value]
         if self.args:
@@ -555,6 +916,8 @@ class Cccs(Component_2T):
 
 class Ccvs(Component_2T):
     """ H - Current Controlled Voltage Source. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Ccvs, self).__init__(*args)
         self.parse(self.elements)
@@ -575,7 +938,7 @@ class Ccvs(Component_2T):
 
     def __str__(self):
         l = [self.instance,
-             *self.ports.values(),
+             *self._ports,
              self.vname,
              self.value]
         if self.args:
@@ -593,6 +956,8 @@ class Ccvs(Component_2T):
 
 class Jfet(Component_3T):
     """ J - JFET Transistor. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Jfet, self).__init__(*args)
 
@@ -607,6 +972,8 @@ class Jfet(Component_3T):
 
 class Mosfet(Component_4T):
     """ M - Mosfet Transistor. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Mosfet, self).__init__(*args)
 
@@ -621,12 +988,16 @@ class Mosfet(Component_4T):
 
 class Lossy_transmission_line(Component_4T):
     """ O - Lossy Transmission Line. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Lossy_transmission_line, self).__init__(*args)
 
 
 class Vcsw(Component_4T):
     """ S - Voltage Controlled Switch. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Vcsw, self).__init__(*args)
 
@@ -641,6 +1012,8 @@ class Vcsw(Component_4T):
 
 class Isource(Component_2T):
     """ I - Current Source. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Isource, self).__init__(*args)
 
@@ -655,6 +1028,8 @@ class Isource(Component_2T):
 
 class Bjt(Component):
     """ Q - Bipolar Transistor. """
+    __slots__ = ("subs_terminal",)
+
     def __init__(self, *args):
         super(Bjt, self).__init__(*args)
 
@@ -688,7 +1063,7 @@ class Bjt(Component):
 
     def __str__(self):
         l = [self.instance,
-             *self.ports.values(),
+             *self._ports,
              self.value]
         if self.args:
             l.append(str(self.argsdata))
@@ -697,18 +1072,24 @@ class Bjt(Component):
 
 class Lossless_transmission_line(Component_4T):
     """ T - Lossless Transmission Line. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Lossless_transmission_line, self).__init__(*args)
 
 
 class Uniformely_distributed_rc_line(Component_3T):
     """ U - Uniformely Distributed RC Line. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Uniformely_distributed_rc_line, self).__init__(*args)
 
 
 class Vsource(Component_2T):
     """ V - Voltage Source. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Vsource, self).__init__(*args)
 
@@ -730,18 +1111,20 @@ class Vsource(Component_2T):
     def __str__(self):
         if (len(self.elements) == 4):
             l = [self.instance,
-                 *self.ports.values(),
+                 *self._ports,
                  self.value]
             return " ".join(l)
         else:
             l = [self.instance,
-                 *self.ports.values(),
+                 *self._ports,
                  " ".join(self.value)]
             return " ".join(l)
 
 
 class Icsw(Component_2T):
     """ W - Current Controlled Switch. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Icsw, self).__init__(*args)
 
@@ -756,6 +1139,8 @@ class Icsw(Component_2T):
 
 class Mesfet(Component_3T):
     """ Z - Mesfet Transistor. """
+    __slots__ = ()
+
     def __init__(self, *args):
         super(Mesfet, self).__init__(*args)
 
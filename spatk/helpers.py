@@ -14,31 +14,64 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
+import os
 import re
+import datetime
+import itertools
+import bz2
+import gzip
+import lzma
+import mmap
 import hashlib
 
 
+class LinetypeTable():
+    """ Longest prefix lookup table of an elementmap.
+
+    Required inputs:
+    ----------------
+    elementmap (dict):  SPICE elementmap.
+
+
+    Description
+    ----------------
+    The keys of the elementmap are compiled once into a set and 
+    the distinct key lengths. A lookup then only tests the prefixes
+    of the first word of a line, longest first, instead of comparing 
+    against every key of the elementmap.
+    """
+    def __init__(self, elementmap):
+        self.keys = frozenset(elementmap.keys())
+        self.lengths = tuple(sorted({len(k) for k in self.keys}, reverse=True))
+        if self.lengths:
+            self.maxlen = self.lengths[0]
+        else:
+            self.maxlen = 0
+
+    def lookup(self, line):
+        """ Find the longest elementmap key the line starts with. """
+        element = line.lstrip()[:self.maxlen].split(" ", 1)[0].upper()
+        keys = self.keys
+        n = len(element)
+        for l in self.lengths:
+            if l <= n and element[:l] in keys:
+                return element[:l]
+        return None
+
+
 def map_linetype(line, elementmap):
     """ map the type of line.
 
     Required inputs:
     ----------------
     line (str):     SPICE netlist line.
-    mapping(dict):  SPICE elementmap.
+    mapping(dict):  SPICE elementmap or a LinetypeTable of it.
 
     """
-
-    line = (line.lstrip()).upper()
-    element = line.split(" ")[0] 
-    k = elementmap.keys()
-    l = 0; t = None
-    for elem in k:
-        if element.startswith(elem):
-            lm = len(elem)
-            if lm > l:
-                l = lm
-                t = elem
-    return t
+    if not isinstance(elementmap, LinetypeTable):
+        elementmap = LinetypeTable(elementmap)
+    return elementmap.lookup(line)
 
 
 def dissect_param(line):
@@ -76,10 +109,14 @@ def touches(circuit, expr):
                         criteria.
     """
     uids = []
+    # Every distinct net is matched once.
+    matches = dict()
     for k in circuit:
-        ports = circuit[k].ports
-        for p in ports:
-            if re.fullmatch(expr, ports[p]):
+        for net in circuit[k].nets:
+            match = matches.get(net)
+            if match is None:
+                match = matches[net] = re.fullmatch(expr, net) is not None
+            if match:
                 uids.append(k)
     return uids
 
@@ -98,14 +135,11 @@ def count_nets(circuit):
     """
     nets = {}
     for k,v in circuit.items():
-        pdict = v.ports
-        if pdict:
-            for node in pdict:
-                net = pdict[node]
-                if net in nets:
-                    nets[net] += 1
-                else:
-                    nets[net] = 1
+        for net in v.nets:
+            if net in nets:
+                nets[net] += 1
+            else:
+                nets[net] = 1
     return nets
 
 
@@ -159,6 +193,45 @@ def filter(circuit, key, val, uids=[]):
     return uids
 
 
+spice_scales = {"t": 12, "g": 9, "meg": 6, "k": 3, "m": -3, 
+                "u": -6, "n": -9, "p": -12, "f": -15, "a": -18}
+
+spice_number_regex = re.compile(r"([+-]?(?:\d+\.?\d*|\.\d+))(?:e([+-]?\d+))?"
+                                r"(meg|mil|[tgkmunpfa])?[^\W\d_]*", 
+                                re.IGNORECASE)
+
+
+def spice_number(val):
+    """ Convert a SPICE number to float.
+
+    Required inputs:
+    ----------------
+    val (str, float):   Number with an optional scale factor and
+                        unit, e.g. "10u", "1.5MEG", "2kOhm" or "1e-3".
+
+
+    Returns
+    ----------------
+    number (float):     The number, None if val is no number, e.g.
+                        an expression like "{2*w}".
+    """
+    if isinstance(val, (int, float)):
+        return float(val)
+    if not isinstance(val, str):
+        return None
+    m = spice_number_regex.fullmatch(val.strip())
+    if not m:
+        return None
+    mantissa, exponent, scale = m.groups()
+    exponent = int(exponent or 0)
+    if scale is None:
+        return float("{}e{}".format(mantissa, exponent))
+    scale = scale.lower()
+    if scale == "mil":
+        return float("{}e{}".format(mantissa, exponent)) * 25.4e-6
+    return float("{}e{}".format(mantissa, exponent + spice_scales[scale]))
+
+
 def unpack_args(args):
     """ Unpack circuit element arguments.
 
@@ -233,21 +306,316 @@ def replace_argument(uid, cir, key, val):
     return cir
 
 
-def read_netlist(filename, keep_comments=False):
+def read_netlist(filename, keep_comments=False, use_mmap=False):
     """ Read a netlist from file and sanitize it.
 
     Required inputs:
     ----------------
     filename (str):         Name/path of the netlist file.
 
+    Optional inputs:
+    ----------------
+    keep_comments (bool):   Dont remove SPICE comments during cleanup.
+    use_mmap (bool):        Read the file through mmap_lines().
+
     Returns
     ----------------
     clean_netlist (str):    Netlist that has been made uniform
                             through the input cleanup process.
     """
-    with open(filename, "r") as ifile:
-        netlist = ifile.read()
-    return clean_netlist(netlist, keep_comments)
+    if use_mmap and not compression(filename):
+        return clean_netlist(mmap_lines(filename, keep_comments), keep_comments)
+    with open_netlist(filename, "r") as ifile:
+        return clean_netlist(file_lines(ifile), keep_comments)
+
+
+compression_extensions = {".gz":    gzip,
+                          ".bz2":   bz2,
+                          ".xz":    lzma,
+                          ".lzma":  lzma}
+
+compression_magic = [(b"\x1f\x8b",         gzip),
+                     (b"BZh",              bz2),
+                     (b"\xfd7zXZ\x00",     lzma),
+                     (b"\x5d\x00\x00",     lzma)]
+
+
+def compression(filename, mode="r"):
+    """ Find the compression of a netlist file.
+
+    Required inputs:
+    ----------------
+    filename (str):     Name/path of the netlist file.
+
+    Optional inputs:
+    ----------------
+    mode (str):         "r" for reading, "w" for writing.
+
+
+    Returns
+    ----------------
+    module (module):    gzip, bz2 or lzma module, None for an
+                        uncompressed file.
+
+
+    Description
+    ----------------
+    The compression is detected by the file extension. Files that
+    are read are also detected by their magic bytes.
+    """
+    ext = os.path.splitext(str(filename))[1].lower()
+    if ext in compression_extensions:
+        return compression_extensions[ext]
+    if mode.startswith("r"):
+        with open(filename, "rb") as ifile:
+            head = ifile.read(6)
+        for magic, module in compression_magic:
+            if head.startswith(magic):
+                return module
+    return None
+
+
+def open_netlist(filename, mode="r"):
+    """ Open a netlist file in text mode.
+
+    Required inputs:
+    ----------------
+    filename (str):     Name/path of the netlist file.
+
+    Optional inputs:
+    ----------------
+    mode (str):         "r" for reading, "w" for writing.
+
+
+    Returns
+    ----------------
+    file (file):        File object. gzip, bz2 and lzma files are 
+                        (de)compressed while streaming through it.
+    """
+    module = compression(filename, mode)
+    if module:
+        return module.open(filename, mode + "t")
+    return open(filename, mode)
+
+
+def write_chunk(fileobj, text, encoding=None):
+    """ Write text to a text file, or encoded to a binary file.
+
+    Returns
+    ----------------
+    size (int):         Number of bytes written, see write_chunks().
+    """
+    if encoding is not None:
+        chunk = text.encode(encoding)
+        fileobj.write(chunk)
+        return len(chunk)
+    fileobj.write(text)
+    if text.isascii():
+        return len(text)
+    return len(text.encode(getattr(fileobj, "encoding", None) or "utf-8"))
+
+
+def netlist_header(name=None):
+    """ Header comment of a written netlist.
+
+    Optional inputs:
+    ----------------
+    name (str):         Name of the netlist, added like the first
+                        line of Circuit.netlist.
+
+    Returns
+    ----------------
+    header (str):       The time the netlist was written, followed
+                        by its name if given.
+    """
+    header = "* Netlist written: {}\n".format(datetime.datetime.now())
+    if name is not None:
+        header = "{}* {}\n\n".format(header, name)
+    return header
+
+
+def write_chunks(fileobj, strings, chunk_size=16384):
+    """ Write strings to a file in chunks.
+
+    Required inputs:
+    ----------------
+    fileobj (file):     Text or binary file object.
+    strings (iter):     Strings to write.
+
+    Optional inputs:
+    ----------------
+    chunk_size (int):   Number of strings joined and written in 
+                        one call.
+
+
+    Returns
+    ----------------
+    size (int):         Number of bytes written, in the encoding of 
+                        fileobj (UTF-8 for binary files) and before 
+                        any compression.
+    """
+    encoding = None
+    if not isinstance(fileobj, io.TextIOBase):
+        encoding = "utf-8"
+    strings = iter(strings)
+    size = 0
+    while True:
+        chunk = list(itertools.islice(strings, chunk_size))
+        if not chunk:
+            return size
+        size = size + write_chunk(fileobj, "".join(chunk), encoding)
+
+
+def find_include(filename, directories):
+    """ Find the file of an .include or .lib statement.
+
+    Required inputs:
+    ----------------
+    filename (str):         Filename as given in the statement.
+    directories (list):     Directories to search in order.
+
+
+    Returns
+    ----------------
+    path (str):             Absolute path of the file.
+
+
+    Description
+    ----------------
+    Quotes around the filename are removed. Since .lib statements
+    are lowercased during cleanup the filename is matched case 
+    insensitive if there is no exact match.
+    """
+    filename = filename.strip("\"'")
+    if os.path.isabs(filename):
+        candidates = [filename]
+    else:
+        candidates = [os.path.join(d, filename) for d in directories]
+    for path in candidates:
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    for path in candidates:
+        directory, name = os.path.split(path)
+        if os.path.isdir(directory):
+            for entry in os.listdir(directory):
+                path = os.path.join(directory, entry)
+                if entry.lower() == name.lower() and os.path.isfile(path):
+                    return os.path.abspath(path)
+    raise FileNotFoundError("Could not find included file: {}".format(filename))
+
+
+def library_section(netlist, section):
+    """ Extract a library section from a netlist.
+
+    Required inputs:
+    ----------------
+    netlist (list):     Cleaned SPICE netlist lines.
+    section (str):      Name of the library section.
+
+
+    Returns
+    ----------------
+    lines (list):       Lines from .lib section to the matching 
+                        .endl statement.
+    """
+    lines = []
+    for line in netlist:
+        if lines:
+            lines.append(line)
+            if line.startswith(".endl"):
+                return lines
+        else:
+            elements = line.split(" ")
+            if (len(elements) == 2 and 
+                elements[0] in [".lib", ".library"] and 
+                elements[1] == section.lower()):
+                lines.append(line)
+    if lines:
+        return lines
+    raise ValueError("Library section not found: {}".format(section))
+
+
+def file_lines(ifile):
+    """ Iterate over the lines of an open netlist file.
+
+    Required inputs:
+    ----------------
+    ifile (file):   File object opened in text mode.
+
+
+    Returns
+    ----------------
+    lines (iter):   Lines without the trailing newline.
+    """
+    for line in ifile:
+        if line[-1:] == "\n":
+            yield line[:-1]
+        else:
+            yield line
+
+
+def mmap_lines(filename, 
+               keep_comments=False, 
+               encoding="utf-8", 
+               block_size=1 << 20):
+    """ Iterate over the lines of a netlist file through mmap.
+
+    Required inputs:
+    ----------------
+    filename (str):         Name/path of the netlist file.
+
+    Optional inputs:
+    ----------------
+    keep_comments (bool):   Keep SPICE comment lines.
+    encoding (str):         Encoding of the netlist file.
+    block_size (int):       Approximate number of bytes decoded at 
+                            once.
+
+
+    Returns
+    ----------------
+    lines (iter):           Lines without the trailing newline.
+
+
+    Description
+    ----------------
+    The file is mapped into memory and never read into a single 
+    string. It is cut into blocks of about block_size bytes at 
+    line boundaries, each block is decoded and split in one call 
+    and comment lines (unless kept) are dropped before they reach 
+    the cleanup. Only one block is held as a string at a time. 
+    Lines have to be terminated by \\n or \\r\\n.
+    """
+    with open(filename, "rb") as ifile:
+        if os.fstat(ifile.fileno()).st_size == 0:
+            return
+        with mmap.mmap(ifile.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            size = len(buf)
+            start = 0
+            while start < size:
+                end = buf.find(b"\n", min(start + block_size, size) - 1)
+                if end == -1:
+                    end = size
+                text = buf[start:end].decode(encoding)
+                start = end + 1
+                if "\r" in text:
+                    text = text.replace("\r\n", "\n")
+                    if text[-1:] == "\r":
+                        text = text[:-1]
+                for line in text.split("\n"):
+                    if keep_comments or line[:1] != "*":
+                        yield line
+
+
+regex_ignore            = re.compile(r"^\+\s*$|^\s{,}$|^\*.*$")
+regex_ignore_keep       = re.compile(r"^\+\s*$|^\s{,}$")
+regex_comment           = re.compile(r"^\*.*|^\s*\*")
+regex_eolcomment        = re.compile(r"\$.*")
+regex_space             = re.compile(r"\t| {1,}")
+regex_assign_space      = re.compile(r" {,}= {,}")
+regex_comma_space       = re.compile(r", {1,}")
+regex_include           = re.compile(r"^.include.*")
+curlybracket_table      = str.maketrans("{}", "''")
 
 
 def clean_netlist(netlist, keep_comments=False):
@@ -265,95 +633,167 @@ def clean_netlist(netlist, keep_comments=False):
 
     Returns
     ----------------
-    netlist (str):          The cleaned netlist
+    netlist (list):         The cleaned netlist
 
 
     Description
     ----------------
     This function will cleanup a netlist and unify it such that
     it can be processed in a reliable manner.
+    See clean_lines() for the individual steps.
+    """
+    return list(clean_lines(netlist, keep_comments))
 
-    The order of the individual steps matters! 
+
+def clean_lines(netlist, keep_comments=False):
+    """ Cleanup a netlist line by line.
+
+    Required inputs:
+    ----------------
+    netlist (str, iter):    Netlist as a single string or any 
+                            iterable of lines.
+
+    Optional inputs:
+    ----------------
+    keep_comments (bool):   Dont remove SPICE comments during cleanup.
+
+
+    Returns
+    ----------------
+    lines (iter):           The cleaned netlist lines.
+
+
+    Description
+    ----------------
+    Single pass over the netlist. Each line is stripped of empty 
+    continuations, comments (if selected) and end of line comments.
+    Continued (+) lines are joined onto the last non comment line 
+    and every complete line is unified by clean_line(). 
+
+    Only the last line that can be continued is held back, together
+    with the comments that follow it, since a later (+) line is 
+    joined across those comments.
     """
     if keep_comments:
-        regex_ignore    = re.compile(r"^\+\s*$|^\s{,}$")
+        ignore = regex_ignore_keep.match
     else:
-        regex_ignore    = re.compile(r"^\+\s*$|^\s{,}$|^\*.*$")
-
-    regex_comment       = re.compile(r"^\*.*|^\s*\*")
-    regex_eolcomment    = re.compile(r"\$.*")
-    regex_contline      = re.compile(r"^\+")
-    regex_contlin_ws    = re.compile(r"^\+\s{,}")
-    regex_space         = re.compile(r"\t| {1,}")
-    regex_assign_space  = re.compile(r" {,}= {,}")
-    regex_comma_space   = re.compile(r", {1,}")
-    regex_include       = re.compile(r"^.include.*")
-    regex_curlybracket  = re.compile(r"[{}]")
+        ignore = regex_ignore.match
 
     if isinstance(netlist, str):
         netlist = netlist.split("\n")
 
-    netlist = [line.lstrip() for line in netlist]
-
-    # Remove emtpy continued (+) lines, emtpy lines
-    # and comments if selected.
-    netlist_a0 = []
+    head = None
+    tail = []
     for line in netlist:
-        if not re.match(regex_ignore, line):
-            netlist_a0.append(line)
-
-    # Remove end of line comments
-    netlist_a = [re.sub(regex_eolcomment, "", line) for line in netlist_a0]
-
-    # Combine split lines back to one
-    netlist_b = []
-
-    i = -1
-    for line in netlist_a:
-        if re.match(regex_contline, line):
-            while True:
-                if re.match(regex_comment, netlist_b[i]):
-                    i = i - 1
-                else:
-                    netlist_b[i] = netlist_b[i] + re.sub(regex_contlin_ws, " ", line)
-                    i = -1
+        line = line.lstrip()
+        c = line[:1]
+        if (not c or c == "+" or c == "*") and ignore(line):
+            continue
+        if "$" in line:
+            line = regex_eolcomment.sub("", line)
+            c = line[:1]
+        if c == "+":
+            # Combine split lines back to one
+            line = " " + line[1:].lstrip()
+            for i in range(len(tail) - 1, -1, -1):
+                if not is_comment(tail[i]):
+                    tail[i] = tail[i] + line
                     break
+            else:
+                if head is None:
+                    raise Exception("Continued line without a preceding line")
+                head = head + line
+        elif c and c != "*" and not c.isspace():
+            if head is not None:
+                yield clean_line(head, False)
+            for elem in tail:
+                yield clean_line(elem)
+            head = line
+            tail = []
+        elif head is None and not tail and c == "*":
+            yield clean_line(line, True)
         else:
-            netlist_b.append(line)
+            # Comments and lines emptied by end of line comments
+            # may still be followed by a continued (+) line.
+            tail.append(line)
+
+    if head is not None:
+        yield clean_line(head, False)
+    for elem in tail:
+        yield clean_line(elem)
+
+
+def is_comment(line):
+    """ Check if a line is a SPICE comment.
+
+    Required inputs:
+    ----------------
+    line (str):     SPICE netlist line.
+
+
+    Returns
+    ----------------
+    comment (bool): True if the line is a comment.
+    """
+    c = line[:1]
+    if c == "*":
+        return True
+    elif c and not c.isspace():
+        return False
+    else:
+        return bool(regex_comment.match(line))
+
+
+def clean_line(line, comment=None):
+    """ Unify a single (joined) netlist line.
+
+    Required inputs:
+    ----------------
+    line (str):         SPICE netlist line.
+
+    Optional inputs:
+    ----------------
+    comment (bool):     The line is a comment. Whitespace and
+                        case of comments are preserved. Detected
+                        from the line if not given.
+
+    Returns
+    ----------------
+    line (str):         The unified line.
+
+
+    Description
+    ----------------
+    The order of the individual steps matters! 
+    """
+    if comment is None:
+        comment = is_comment(line)
 
     # Unify Whitespace
-    netlist_c = []
-    for line in netlist_b:
-        if re.match(regex_comment, line):
-            netlist_c.append(line)
-        else:
-            netlist_c.append(re.sub(regex_space, " ", line))
+    if not comment and ("\t" in line or "  " in line):
+        line = regex_space.sub(" ", line)
 
     # Remove whitespace inside expression
-    netlist_d = [remove_enclosed_space(line) for line in netlist_c]
+    if "'" in line:
+        line = remove_enclosed_space(line)
 
     # Remove space around assignments
-    netlist_e = [re.sub(regex_assign_space, "=", line) for line in netlist_d]
+    if "=" in line:
+        line = regex_assign_space.sub("=", line)
 
     # Remove space after comma
-    netlist_f = [re.sub(regex_comma_space, ",", line) for line in netlist_e]
+    if ", " in line:
+        line = regex_comma_space.sub(",", line)
 
     # substitue curly brackets with single quotes
-    netlist_g = [re.sub(regex_curlybracket, "'", line) for line in netlist_f]
+    if "{" in line or "}" in line:
+        line = line.translate(curlybracket_table)
 
     # Lowercase all letters unless .include statement
-    netlist_h = []
-    for line in netlist_g:
-        if re.match(regex_include, line):
-            netlist_h.append(line)
-        elif re.match(regex_comment, line):
-            netlist_h.append(line)
-        else:
-            netlist_h.append(line.lower())
-
-    return [x.strip() for x in netlist_h]
-
+    if not comment and not (line[1:8] == "include" and regex_include.match(line)):
+        line = line.lower()
 
+    return line.strip()
 
 
 def remove_enclosed_space(string):
@@ -370,24 +810,83 @@ def remove_enclosed_space(string):
     string (str):   String with whitespace between 
                     single quotes removed.
     """
-    state = False
-    parsed = []
-    for c in string:
-        if c == "'":
-            if state:
-                state = False
-            else:
-                state = True
-            parsed.append(c)
-        else:
-            if state:
-                if c == " ":
-                    pass
-                else:
-                    parsed.append(c)
-            else:
-                parsed.append(c)
-    return "".join(parsed)
+    parts = string.split("'")
+    for i in range(1, len(parts), 2):
+        parts[i] = parts[i].replace(" ", "")
+    return "'".join(parts)
+
+
+def md5_uid(line, n, location, k):
+    """ uid scheme "md5": md5 hexdigest of line number and line. 
+
+    Required inputs:
+    ----------------
+    line (str):         SPICE netlist line of the element.
+    n (int):            Line number of the element.
+    location (str):     Location of the element in the hierachy.
+    k (int):            Index of the element within the line, this
+                        is only non zero for combined .param lines.
+
+    Returns
+    ----------------
+    uid (str):          uid.
+    """
+    return get_uid(line, n)
+
+
+def location_uid(line, n, location, k):
+    """ uid scheme "location": (location, n, k) tuple. 
+
+    See md5_uid() for the inputs. 
+    """
+    return (location, n, k)
+
+
+class IntUid():
+    """ uid scheme "int": monotonic integer.
+
+    Optional inputs:
+    ----------------
+    start (int):    First uid.
+    """
+    def __init__(self, start=0):
+        self.next = start
+
+    def __call__(self, line, n, location, k):
+        uid = self.next
+        self.next = uid + 1
+        return uid
+
+
+def uid_scheme(scheme="md5"):
+    """ Get the uid function of a uid scheme.
+
+    Optional inputs:
+    ----------------
+    scheme (str, func): "md5", "int", "location" or a function
+                        with the signature of md5_uid().
+
+    Returns
+    ----------------
+    uid (func):         Function that creates a uid from the
+                        line, n, location and k of an element.
+
+
+    Description
+    ----------------
+    "md5" is the compatible default. "int" numbers the elements,
+    "location" uses their position in the netlist. Both avoid the
+    hashing and the 32 character string per element.
+    """
+    if callable(scheme):
+        return scheme
+    elif scheme == "md5":
+        return md5_uid
+    elif scheme == "location":
+        return location_uid
+    elif scheme == "int":
+        return IntUid()
+    raise ValueError("Unknown uid scheme: {}".format(scheme))
 
 
 def get_uid(s, i):
@@ -0,0 +1,442 @@
+# SPATK - Spice Analysis ToolKit
+# Copyright (C) 2026 Christoph Weiser
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import math
+import heapq
+import bisect
+
+
+class NetIndex:
+    """ Inverted index from net names to circuit elements.
+
+    Description
+    ----------------
+    Maps every net to the uids of the elements with a port on it and
+    the number of such ports. The uids are kept in the order they
+    were added, which is the order of the Circuit, so lookups return
+    the same list as a scan over all elements would.
+    """
+    def __init__(self):
+        self.nets = dict()
+        self.order = dict()
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.nets)
+
+    def __contains__(self, net):
+        return net in self.nets
+
+    def add(self, uid, nets):
+        """ Add an element with the ports nets. """
+        self.order[uid] = self.seq
+        self.seq = self.seq + 1
+        self._link(uid, nets)
+
+    def remove(self, uid, nets):
+        """ Remove an element with the ports nets. """
+        self.order.pop(uid, None)
+        self._unlink(uid, nets)
+
+    def update(self, uid, old, new):
+        """ Move the ports of an element from the nets old to new. """
+        if old != new:
+            self._unlink(uid, old)
+            self._link(uid, new)
+
+    def _link(self, uid, nets):
+        for net in nets:
+            uids = self.nets.get(net)
+            if uids is None:
+                uids = self.nets[net] = dict()
+            uids[uid] = uids.get(uid, 0) + 1
+
+    def _unlink(self, uid, nets):
+        for net in nets:
+            uids = self.nets[net]
+            if uids[uid] > 1:
+                uids[uid] = uids[uid] - 1
+            else:
+                del uids[uid]
+                if not uids:
+                    del self.nets[net]
+
+    def _ordered(self, counts):
+        order = self.order
+        return [uid for uid in sorted(counts, key=order.__getitem__)
+                for i in range(counts[uid])]
+
+    def uids(self, net):
+        """ uids on the net, once for every port on it. """
+        return self._ordered(self.nets.get(net, {}))
+
+    def match(self, expr):
+        """ uids on nets matching the regex expr, once per port. """
+        regex = re.compile(expr)
+        counts = dict()
+        for net, uids in self.nets.items():
+            if regex.fullmatch(net):
+                for uid, count in uids.items():
+                    counts[uid] = counts.get(uid, 0) + count
+        return self._ordered(counts)
+
+
+class Duplicates(list):
+    """ uids sharing one key of a NameIndex. """
+    __slots__ = ()
+
+
+class NameIndex:
+    """ Index from names to circuit elements.
+
+    Description
+    ----------------
+    Maps keys like (location, instance) to the uid of the element.
+    Keys are expected to be unique, a key shared by several elements
+    maps to all of their uids as Duplicates.
+    """
+    def __init__(self):
+        self.keys = dict()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def add(self, key, uid):
+        """ Add uid under key. """
+        uids = self.keys.get(key, self)
+        if uids is self:
+            self.keys[key] = uid
+        elif type(uids) is Duplicates:
+            uids.append(uid)
+        else:
+            self.keys[key] = Duplicates([uids, uid])
+
+    def remove(self, key, uid):
+        """ Remove uid from key. """
+        uids = self.keys[key]
+        if type(uids) is Duplicates:
+            uids.remove(uid)
+            if len(uids) == 1:
+                self.keys[key] = uids[0]
+        else:
+            del self.keys[key]
+
+    def update(self, uid, old, new):
+        """ Move uid from the key old to new, None for no key. """
+        if old != new:
+            if old is not None:
+                self.remove(old, uid)
+            if new is not None:
+                self.add(new, uid)
+
+    def get(self, key):
+        """ uid of key, Duplicates if it is shared, None if unknown. """
+        return self.keys.get(key)
+
+    def first(self, key, position):
+        """ uid of key, None if unknown.
+
+        Of Duplicates the uid with the lowest position(uid) is returned.
+        """
+        uids = self.keys.get(key)
+        if type(uids) is Duplicates:
+            return min(uids, key=position)
+        return uids
+
+
+class BucketIndex:
+    """ Index from keys to buckets of circuit elements.
+
+    Description
+    ----------------
+    Keeps one bucket of uids per key. Each uid carries the position 
+    it was added at, so the uids of several buckets are merged in 
+    circuit order. version counts the changes, so lookups can be 
+    cached until the next one.
+    """
+    def __init__(self):
+        self.buckets = dict()
+        self.unsorted = set()
+        self.seq = 0
+        self.version = 0
+
+    def add(self, uid, key, seq=None):
+        """ Add uid under key, at the end unless seq is given. """
+        if seq is None:
+            seq = self.seq
+            self.seq = self.seq + 1
+        self.version = self.version + 1
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = dict()
+        elif seq < next(reversed(bucket.values())):
+            self.unsorted.add(key)
+        bucket[uid] = seq
+
+    def remove(self, uid, key):
+        """ Remove uid from key, returns its position. """
+        bucket = self.buckets[key]
+        seq = bucket.pop(uid)
+        self.version = self.version + 1
+        if not bucket:
+            del self.buckets[key]
+            self.unsorted.discard(key)
+        return seq
+
+    def update(self, uid, old, new):
+        """ Move uid from the key old to new keeping its position. """
+        if old != new:
+            self.add(uid, new, self.remove(uid, old))
+
+    def _buckets(self, match, keys=None):
+        buckets = []
+        if keys is None:
+            keys = self.buckets
+        for key in keys:
+            bucket = self.buckets[key]
+            if match(key):
+                if key in self.unsorted:
+                    bucket = dict(sorted(bucket.items(), key=lambda item: item[1]))
+                    self.buckets[key] = bucket
+                    self.unsorted.discard(key)
+                buckets.append(bucket)
+        return buckets
+
+    def get(self, key):
+        """ uids of key in circuit order. """
+        if key not in self.buckets:
+            return []
+        return list(self._buckets(lambda other: other == key, [key])[0])
+
+    def select(self, match):
+        """ uids of all keys for which match(key) is true, in circuit order. """
+        buckets = self._buckets(match)
+        if len(buckets) == 1:
+            return list(buckets[0])
+        items = heapq.merge(*(((seq, uid) for uid, seq in bucket.items()) 
+                              for bucket in buckets), 
+                            key=lambda item: item[0])
+        return [uid for seq, uid in items]
+
+    def size(self, match):
+        """ Number of uids of all keys for which match(key) is true. """
+        return sum(len(bucket) for key, bucket in self.buckets.items() 
+                   if match(key))
+
+
+class TypeIndex(BucketIndex):
+    """ Index from element classes to circuit elements.
+
+    Description
+    ----------------
+    A BucketIndex keyed by the element class, the uids of all 
+    subclasses of a class are merged in circuit order.
+    """
+    def uids(self, elemtype):
+        """ uids of all instances of elemtype in circuit order. """
+        return self.select(lambda cls: issubclass(cls, elemtype))
+
+    def count(self, elemtype):
+        """ Number of instances of elemtype. """
+        return self.size(lambda cls: issubclass(cls, elemtype))
+
+
+class NumericIndex:
+    """ Sorted index of a numeric field of circuit elements.
+
+    Description
+    ----------------
+    Keeps the (number, position) keys of the elements sorted, so range
+    and top-k lookups are a bisection and a slice. The position (see
+    BucketIndex) orders elements with equal numbers in circuit order.
+    Elements without a number are not in the index.
+    """
+    def __init__(self):
+        self.keys = []
+        self.uids = []
+        self.entries = dict()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, uid, number, seq):
+        """ Add uid with number at position seq, None is skipped. """
+        if number is None:
+            return
+        key = (number, seq)
+        i = bisect.bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.uids.insert(i, uid)
+        self.entries[uid] = key
+
+    def extend(self, entries):
+        """ Add (uid, number, seq) entries, sorted once. """
+        items = list(zip(self.keys, self.uids))
+        for uid, number, seq in entries:
+            if number is not None:
+                key = self.entries[uid] = (number, seq)
+                items.append((key, uid))
+        items.sort(key=lambda item: item[0])
+        self.keys = [key for key, uid in items]
+        self.uids = [uid for key, uid in items]
+
+    def remove(self, uid):
+        """ Remove uid if it is in the index. """
+        key = self.entries.pop(uid, None)
+        if key is not None:
+            i = bisect.bisect_left(self.keys, key)
+            del self.keys[i]
+            del self.uids[i]
+
+    def update(self, uid, number, seq):
+        """ Change the number of uid. """
+        if self.entries.get(uid) != (number, seq):
+            self.remove(uid)
+            self.add(uid, number, seq)
+
+    def range(self, low=None, high=None, inclusive="both"):
+        """ uids with low <= number <= high in ascending order.
+
+        inclusive is "both", "neither", "left" or "right" and selects
+        which of the bounds are included. A bound of None is open.
+        """
+        if inclusive not in ("both", "neither", "left", "right"):
+            raise ValueError("Unknown inclusive: {}".format(inclusive))
+        start = 0
+        stop = len(self.keys)
+        if low is not None:
+            if inclusive in ("both", "left"):
+                start = bisect.bisect_left(self.keys, (low,))
+            else:
+                start = bisect.bisect_left(self.keys, (low, math.inf))
+        if high is not None:
+            if inclusive in ("both", "right"):
+                stop = bisect.bisect_left(self.keys, (high, math.inf))
+            else:
+                stop = bisect.bisect_left(self.keys, (high,))
+        return self.uids[start:max(start, stop)]
+
+    def top(self, k, largest=True):
+        """ uids of the k largest (or smallest) numbers, in that order. """
+        if k <= 0:
+            return []
+        if largest:
+            return self.uids[:-k-1:-1]
+        return self.uids[:k]
+
+
+class HierarchyIndex:
+    """ Index of the subcircuit definitions and instances.
+
+    Description
+    ----------------
+    Every subcircuit definition (.subckt) and instance (X) has an 
+    entry (kind, name, location), where kind is "subckt" or 
+    "instance" and name is the name of the subcircuit. The index 
+    keeps
+
+        definitions:    the definition uids and their locations
+                        by subcircuit name,
+        instances:      the instance uids by subcircuit name in 
+                        circuit order (see BucketIndex),
+        children:       the number of instances of each subcircuit
+                        by the location they are placed at.
+    """
+    def __init__(self):
+        self.entries = dict()
+        self.definitions = dict()
+        self.instances = BucketIndex()
+        self.children = dict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, uid, entry, seq=None):
+        """ Set the entry of uid, None to remove it.
+
+        seq is the position of an instance, see BucketIndex.add().
+        """
+        old = self.entries.get(uid)
+        if old == entry:
+            return
+        if old is not None:
+            self._remove(uid, old)
+        if entry is not None:
+            self._add(uid, entry, seq)
+
+    def _add(self, uid, entry, seq):
+        kind, name, location = entry
+        self.entries[uid] = entry
+        if kind == "subckt":
+            self.definitions.setdefault(name, dict())[uid] = location
+            return
+        self.instances.add(uid, name, seq)
+        children = self.children.setdefault(location, dict())
+        children[name] = children.get(name, 0) + 1
+
+    def _remove(self, uid, entry):
+        kind, name, location = entry
+        del self.entries[uid]
+        if kind == "subckt":
+            definitions = self.definitions[name]
+            del definitions[uid]
+            if not definitions:
+                del self.definitions[name]
+            return
+        self.instances.remove(uid, name)
+        children = self.children[location]
+        if children[name] > 1:
+            children[name] = children[name] - 1
+        else:
+            del children[name]
+            if not children:
+                del self.children[location]
+
+    def resolve(self, name, location="/"):
+        """ uid of the definition of name as seen from location.
+
+        Definitions nested in location come first, then those of the
+        enclosing subcircuits up to the top level. None if there is 
+        no such definition.
+        """
+        definitions = self.definitions.get(name)
+        if not definitions:
+            return None
+        scopes = dict()
+        for uid, path in definitions.items():
+            scopes.setdefault(path.rsplit("/", 1)[0] or "/", uid)
+        scope = location
+        while True:
+            uid = scopes.get(scope)
+            if uid is not None or scope == "/":
+                return uid
+            scope = scope.rsplit("/", 1)[0] or "/"
+
+    def uids(self, name):
+        """ uids of the instances of name in circuit order. """
+        return self.instances.get(name)
+
+    def parents(self, name):
+        """ Number of instances of name by the location they are at. """
+        parents = dict()
+        for uid in self.uids(name):
+            location = self.entries[uid][2]
+            parents[location] = parents.get(location, 0) + 1
+        return parents
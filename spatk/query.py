@@ -0,0 +1,199 @@
+# SPATK - Spice Analysis ToolKit
+# Copyright (C) 2026 Christoph Weiser
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import operator
+
+from spatk.helpers import spice_number
+
+
+def _equals(val):
+    if isinstance(val, str):
+        return lambda attr: str(attr) == val
+    return lambda attr: attr == val
+
+
+def _member(val):
+    val = list(val)
+    if all(isinstance(v, str) for v in val):
+        val = set(val)
+        return lambda attr: str(attr) in val
+    return lambda attr: attr in val
+
+
+def _regex(val):
+    regex = re.compile(val)
+    return lambda attr: regex.fullmatch(str(attr)) is not None
+
+
+def _under(val):
+    prefix = val.rstrip("/") + "/"
+    return lambda attr: attr == val or str(attr).startswith(prefix)
+
+
+def _touches(val):
+    regex = re.compile(val)
+    return lambda attr: any(regex.fullmatch(net) for net in attr)
+
+
+def _compare(compare):
+    def compile(val):
+        number = spice_number(val)
+        if number is None:
+            raise ValueError("Not a number: {}".format(val))
+        def test(attr):
+            attr = spice_number(attr)
+            return attr is not None and compare(attr, number)
+        return test
+    return compile
+
+
+def _negate(test):
+    return lambda attr: not test(attr)
+
+
+operators = {"==":      _equals,
+             "!=":      lambda val: _negate(_equals(val)),
+             "~":       _regex,
+             "!~":      lambda val: _negate(_regex(val)),
+             "in":      _member,
+             "under":   _under,
+             "touches": _touches,
+             "<":       _compare(operator.lt),
+             "<=":      _compare(operator.le),
+             ">":       _compare(operator.gt),
+             ">=":      _compare(operator.ge)}
+
+
+def field(element, key):
+    """ Property key of element, else its argument key. 
+
+    Raises AttributeError if element has neither.
+    """
+    try:
+        return getattr(element, key)
+    except AttributeError:
+        args = getattr(element, "args", None)
+        if isinstance(args, dict) and key in args:
+            return args[key]
+        raise
+
+
+def memoize(test):
+    """ Cache the results of test for every distinct string. """
+    memo = dict()
+    def memoized(attr):
+        if type(attr) is not str:
+            return test(attr)
+        hit = memo.get(attr)
+        if hit is None:
+            hit = memo[attr] = test(attr)
+        return hit
+    return memoized
+
+
+class Query:
+    """ Compiled conjunction of element predicates.
+
+    Required inputs:
+    ----------------
+    predicates (list):  (key, operator, value) tuples, all of which
+                        need to hold for an element to match.
+
+
+    Description
+    ----------------
+    key is an element property, e.g. "type", "location", "instance",
+    "model" or "nets", or else an argument of the element like "w".
+    The operators are:
+
+        ==          str(property) equals value (property == value
+                    if value is not a str).
+        !=          Negation of ==.
+        ~           value is a regex that fully matches str(property),
+                    like Circuit.filter().
+        !~          Negation of ~.
+        in          str(property) is one of the values.
+        under       property is the location value or below it in
+                    the hierarchy, e.g. "/core" matches "/core" and
+                    "/core/bias".
+        touches     One of the nets fully matches the regex value,
+                    only for the key "nets".
+        < <= > >=   Numeric comparison, the property and value are
+                    SPICE numbers like "10u", see spice_number().
+
+    Elements without the property never match. A Query is compiled
+    once and can be run many times, see Circuit.query(). Predicates
+    on "type" and "location" are decided once per element class and
+    location, "touches" is decided on the net index, the others are
+    evaluated per element with their results cached per distinct
+    value.
+    """
+    def __init__(self, predicates):
+        self.predicates = list(predicates)
+        self.types = []
+        self.locations = []
+        self.nets = []
+        self.tests = []
+        for predicate in self.predicates:
+            try:
+                key, op, val = predicate
+            except (TypeError, ValueError):
+                raise ValueError("Predicates are (key, operator, value) tuples, "
+                                 "not: {}".format(predicate))
+            if op not in operators:
+                raise ValueError("Unknown operator: {}".format(op))
+            if op == "touches" and key != "nets":
+                raise ValueError("Operator touches is only defined for nets, "
+                                 "not: {}".format(predicate))
+            test = operators[op](val)
+            if key == "type":
+                self.types.append(test)
+            elif key == "location":
+                self.locations.append(test)
+            elif op == "touches":
+                self.nets.append(val)
+            else:
+                self.tests.append((key, memoize(test)))
+
+    def __repr__(self):
+        return "Query({})".format(self.predicates)
+
+    def match_type(self, cls):
+        """ Check the type predicates against an element class. """
+        name = cls.__name__.lower()
+        return all(test(name) for test in self.types)
+
+    def match_location(self, location):
+        """ Check the location predicates against a location. """
+        return all(test(location) for test in self.locations)
+
+    def match(self, element, get=field):
+        """ Check the remaining predicates against an element. 
+
+        Optional inputs:
+        ----------------
+        get (func):     Reads the property key of element as
+                        get(element, key), field() by default.
+        """
+        for key, test in self.tests:
+            try:
+                attr = get(element, key)
+            except AttributeError:
+                return False
+            if not test(attr):
+                return False
+        return True
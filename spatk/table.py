@@ -0,0 +1,479 @@
+# SPATK - Spice Analysis ToolKit
+# Copyright (C) 2026 Christoph Weiser
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import array
+import collections.abc
+
+from spatk.genelems import (Default,
+                            Component,
+                            Component_2T,
+                            Component_3T,
+                            Component_4T)
+
+
+# Number of ports of the generic component parsers.
+component_ports = {Component_2T.parse: 2,
+                   Component_3T.parse: 3,
+                   Component_4T.parse: 4}
+
+
+def token_layout(cls):
+    """ Find how the columns of an element class are read from tokens.
+
+    Required inputs:
+    ----------------
+    cls (class):        Circuit element class.
+
+
+    Returns
+    ----------------
+    layout (int):       Number of ports following the instance name
+                        and preceding the value, 0 for elements
+                        without instance, ports and value, None if
+                        the element has to be built to read them.
+    """
+    if not cls.__module__.startswith("spatk."):
+        return None
+    if (cls.value is not Default.value or cls.nets is not Default.nets or
+        cls.instance is not Default.instance):
+        return None
+    if issubclass(cls, Component):
+        return component_ports.get(cls.parse)
+    if cls.parse is Default.parse:
+        return 0
+    return None
+
+
+class InternTable:
+    """ Interned names with integer ids.
+
+    Description
+    ----------------
+    Every distinct name is stored once and identified by the
+    position it was first interned at.
+    """
+    def __init__(self):
+        self.names = []
+        self.ids = dict()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def intern(self, name):
+        """ Id of name, the name is added if it is unknown. """
+        i = self.ids.get(name)
+        if i is None:
+            i = len(self.names)
+            self.ids[name] = i
+            self.names.append(name)
+        return i
+
+    def id(self, name):
+        """ Id of name, None if the name is unknown. """
+        return self.ids.get(name)
+
+    def canonical(self, name):
+        """ The interned string equal to name. """
+        return self.names[self.intern(name)]
+
+    def name(self, i):
+        """ Name of id i. """
+        return self.names[i]
+
+
+class ElementTable(collections.abc.MutableMapping):
+    """ Columnar storage of circuit elements.
+
+    Required inputs:
+    ----------------
+    elementmap (dict):          SPICE elementmap.
+
+
+    Optional inputs:
+    ----------------
+    element_settings (dict):    Element specific settings.
+    nets (InternTable):         Net table to intern the net names 
+                                into, a new one if not given.
+    owner (Circuit):            Circuit notified about changes of 
+                                the built elements.
+
+
+    Description
+    ----------------
+    Maps uids to circuit elements like the dict of a Circuit, but
+    keeps every element as one row of parallel integer arrays:
+    its element class, instance name, location, library, line number,
+    value and ports. Names are interned, so every distinct string is
+    stored once, ports are kept in one flat array of net ids.
+
+    Elements are built from their netlist line the first time they
+    are accessed and kept from then on. Changes to built elements
+    are written back into the columns before every bulk operation,
+    i.e. element_types(), count_nets() and filter(), which 
+    otherwise only loop over the integer arrays.
+
+    Deleted rows and net ids that were replaced by a longer list of 
+    ports are left as dead entries. Shorter lists of ports reuse 
+    their slots. Once more than half of the rows or of the net ids 
+    are dead the table is compacted, see compact().
+    """
+    def __init__(self, elementmap, element_settings=[], nets=None, owner=None):
+        self.elementmap = elementmap
+        self.element_settings = element_settings
+        self.rows = dict()
+        self.uids = []
+        self.lines = []
+        self.kind_ids = array.array("l")
+        self.type_ids = array.array("l")
+        self.instance_ids = array.array("l")
+        self.location_ids = array.array("l")
+        self.lib_ids = array.array("l")
+        self.value_ids = array.array("l")
+        self.ns = array.array("q")
+        self.net_start = array.array("q")
+        self.net_count = array.array("l")
+        self.net_ids = array.array("l")
+        self.dead_nets = 0
+        self.kinds = InternTable()
+        self.types = InternTable()
+        self.strings = InternTable()
+        if nets is None:
+            nets = InternTable()
+        self.nets = nets
+        self.owner = owner
+        self.built = dict()
+        self.layouts = dict()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __reversed__(self):
+        return reversed(self.rows)
+
+    def __contains__(self, uid):
+        return uid in self.rows
+
+    def __getitem__(self, uid):
+        row = self.rows[uid]
+        element = self.built.get(row)
+        if element is None:
+            element = self._build(row)
+            self.built[row] = element
+        return element
+
+    def __setitem__(self, uid, element):
+        row = self._row(uid)
+        self.lines[row] = None
+        self.kind_ids[row] = -1
+        self.built[row] = element
+        self._store(row, element)
+        self._reclaim()
+
+    def __delitem__(self, uid):
+        row = self.rows.pop(uid)
+        self.built.pop(row, None)
+        self.lines[row] = None
+        self.type_ids[row] = -1
+        self._set_nets(row, ())
+        self._reclaim()
+
+    def raw(self, uid):
+        """ Element or record of uid without building the element. """
+        row = self.rows[uid]
+        element = self.built.get(row)
+        if element is not None:
+            return element
+        strings = self.strings.names
+        return (self.lines[row],
+                self.kinds.names[self.kind_ids[row]],
+                strings[self.location_ids[row]],
+                strings[self.lib_ids[row]],
+                self.ns[row])
+
+    def attribute(self, uid, key):
+        """ Attribute key of uid, read from the columns if possible. """
+        row = self.rows[uid]
+        element = self.built.get(row)
+        column = self._column(key)
+        if element is not None or column is None:
+            return getattr(self[uid], key)
+        ids, names = column
+        if names is None:
+            return ids[row]
+        return names[ids[row]]
+
+    def nets_of(self, uid):
+        """ Port nets of uid without building the element. """
+        row = self.rows[uid]
+        element = self.built.get(row)
+        if element is not None:
+            return element.nets
+        start = self.net_start[row]
+        names = self.nets.names
+        return tuple(names[i] for i in self.net_ids[start:start+self.net_count[row]])
+
+    def add_record(self, uid, record):
+        """ Add an element record, see parse_records(). """
+        line, elemtype, location, library, n = record
+        cls = self.elementmap[elemtype]
+        layout = self.layouts.get(cls, False)
+        if layout is False:
+            layout = self.layouts[cls] = token_layout(cls)
+        if layout is None:
+            element = cls(line, location, library, n, uid,
+                          self._settings(cls))
+            instance = element.instance
+            nets = element.nets
+            value = element.value
+        elif layout:
+            tokens = line.split(" ")
+            instance = tokens[0]
+            nets = tokens[1:layout+1]
+            value = tokens[layout+1]
+        else:
+            instance = None
+            nets = ()
+            value = None
+        row = self._row(uid)
+        self.lines[row] = line
+        self.kind_ids[row] = self.kinds.intern(elemtype)
+        self._set_columns(row, cls, instance, location, library, n, value, nets)
+
+    def extend(self, records):
+        """ Add (uid, record) tuples, see parse_records(). """
+        for uid, record in records:
+            self.add_record(uid, record)
+
+    def _row(self, uid):
+        row = self.rows.get(uid)
+        if row is not None:
+            self.built.pop(row, None)
+            return row
+        row = len(self.uids)
+        self.rows[uid] = row
+        self.uids.append(uid)
+        self.lines.append(None)
+        for column in (self.kind_ids, self.type_ids, self.instance_ids,
+                       self.location_ids, self.lib_ids, self.value_ids,
+                       self.ns, self.net_count):
+            column.append(0)
+        self.net_start.append(len(self.net_ids))
+        return row
+
+    def _settings(self, cls):
+        if cls.__name__ in self.element_settings:
+            return self.element_settings[cls.__name__]
+        return []
+
+    def _build(self, row):
+        cls = self.types.names[self.type_ids[row]]
+        strings = self.strings.names
+        element = cls(self.lines[row],
+                      strings[self.location_ids[row]],
+                      strings[self.lib_ids[row]],
+                      self.ns[row],
+                      self.uids[row],
+                      self._settings(cls))
+        if self.owner is not None:
+            self.owner._adopt(element)
+        else:
+            element.intern_nets(self.nets.canonical)
+        return element
+
+    def _store(self, row, element):
+        self._set_columns(row,
+                          type(element),
+                          element.instance,
+                          element.location,
+                          element.lib,
+                          element.n,
+                          element.value,
+                          element.nets)
+
+    def _set_columns(self, row, cls, instance, location, lib, n, value, nets):
+        intern = self.strings.intern
+        if not (value is None or isinstance(value, str)):
+            value = str(value)
+        self.type_ids[row] = self.types.intern(cls)
+        self.instance_ids[row] = intern(instance)
+        self.location_ids[row] = intern(location)
+        self.lib_ids[row] = intern(lib)
+        self.value_ids[row] = intern(value)
+        self.ns[row] = n
+        self._set_nets(row, nets)
+
+    def _set_nets(self, row, nets):
+        start = self.net_start[row]
+        count = self.net_count[row]
+        ids = [self.nets.intern(net) for net in nets]
+        if len(ids) <= count:
+            ids.extend([-1] * (count - len(ids)))
+            self.net_ids[start:start+count] = array.array("l", ids)
+            self.net_count[row] = len(nets)
+            self.dead_nets = self.dead_nets + count - len(nets)
+            return
+        for i in range(start, start+count):
+            self.net_ids[i] = -1
+        self.dead_nets = self.dead_nets + count
+        self.net_start[row] = len(self.net_ids)
+        self.net_count[row] = len(ids)
+        self.net_ids.extend(ids)
+
+    def _reclaim(self):
+        if (len(self.uids) > 2*len(self.rows) or 
+            self.dead_nets > len(self.net_ids) // 2):
+            self.compact()
+
+    def compact(self):
+        """ Drop deleted rows and dead net ids.
+
+        Description
+        ----------------
+        The live rows are moved to the front in their order, the 
+        ports of every row are copied into a new flat array of net
+        ids. Row numbers change, uids stay the same.
+        """
+        rows = list(self.rows.values())
+        for name in ("kind_ids", "type_ids", "instance_ids", "location_ids",
+                     "lib_ids", "value_ids", "ns", "net_count"):
+            column = getattr(self, name)
+            setattr(self, name, array.array(column.typecode, 
+                                            (column[row] for row in rows)))
+        net_start = array.array("q")
+        net_ids = array.array("l")
+        for i, row in enumerate(rows):
+            start = self.net_start[row]
+            net_start.append(len(net_ids))
+            net_ids.extend(self.net_ids[start:start+self.net_count[i]])
+        self.net_start = net_start
+        self.net_ids = net_ids
+        self.dead_nets = 0
+        self.lines = [self.lines[row] for row in rows]
+        self.uids = [self.uids[row] for row in rows]
+        self.built = {i: self.built[row] for i, row in enumerate(rows)
+                      if row in self.built}
+        self.rows = {uid: i for i, uid in enumerate(self.uids)}
+
+    def sync(self):
+        """ Write the built elements back into the columns. """
+        for row, element in self.built.items():
+            self._store(row, element)
+        self._reclaim()
+
+    def element_types(self):
+        """ Find which elements are contained in the table.
+
+        Returns
+        ----------------
+        elements (set):     Set of element types.
+        """
+        self.sync()
+        types = self.types.names
+        return {types[i].__name__.lower() for i in set(self.type_ids) if i >= 0}
+
+    def count_nets(self):
+        """ Count the number of port connections to any net.
+
+        Returns
+        ----------------
+        nets(dict):         dictionary with net, count pairs.
+        """
+        self.sync()
+        counts = collections.Counter(self.net_ids)
+        counts.pop(-1, None)
+        names = self.nets.names
+        return {names[i]: count for i, count in counts.items()}
+
+    def _column(self, key):
+        """ (ids, names) of the column behind the attribute key. """
+        if key == "instance":
+            return self.instance_ids, self.strings.names
+        if key == "location":
+            return self.location_ids, self.strings.names
+        if key == "lib":
+            return self.lib_ids, self.strings.names
+        if key == "value":
+            return self.value_ids, self.strings.names
+        if key == "type":
+            return self.type_ids, [cls.__name__.lower() for cls in self.types]
+        if key == "n":
+            return self.ns, None
+        if key == "uid":
+            return range(len(self.uids)), self.uids
+        return None
+
+    def filter(self, key, val, uids=[]):
+        """ Filter elements by regex.
+
+        Required inputs:
+        ----------------
+        key (str):          property to filter.
+        val (str):          regex for filter.
+
+
+        Optional inputs:
+        ----------------
+        uids (list):        List of preselected uids.
+
+
+        Returns
+        ----------------
+        matches (list):     List of uid's that matches the
+                            criteria.
+
+
+        Description
+        ----------------
+        Properties stored as a column are matched once per distinct
+        value, any other property is read from the built elements.
+        """
+        self.sync()
+        if not uids:
+            uids = self.rows
+        regex = re.compile(val)
+        matches = []
+        column = self._column(key)
+        if column is None:
+            has_key = dict()
+            for uid in uids:
+                cls = self.types.names[self.type_ids[self.rows[uid]]]
+                if cls not in has_key:
+                    has_key[cls] = key in dir(cls)
+                if has_key[cls]:
+                    if regex.fullmatch(str(getattr(self[uid], key))):
+                        matches.append(uid)
+            return matches
+        ids, names = column
+        memo = dict()
+        for uid in uids:
+            i = ids[self.rows[uid]]
+            hit = memo.get(i)
+            if hit is None:
+                name = names[i] if names is not None else i
+                hit = memo[i] = regex.fullmatch(str(name)) is not None
+            if hit:
+                matches.append(uid)
+        return matches
@@ -0,0 +1,90 @@
+# SPATK - Spice Analysis ToolKit
+# Copyright (C) 2026 Christoph Weiser
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from spatk.helpers import open_netlist, netlist_header, write_chunks
+
+
+class Template:
+    """ Precompiled netlist with variable fields.
+
+    Required inputs:
+    ----------------
+    parts (list):       Netlist text with a default value in place of
+                        every field.
+    positions (dict):   Indexes into parts by field.
+
+
+    Description
+    ----------------
+    Created by Circuit.compile_template(). The netlist between the
+    fields is joined into one chunk of text, so rendering only puts
+    the values into place and joins a few strings. No elements are
+    built. Later changes of the Circuit do not change the Template.
+    """
+    def __init__(self, parts, positions):
+        self.parts = parts
+        self.positions = positions
+
+    @property
+    def fields(self):
+        """ The fields of the Template. """
+        return list(self.positions)
+
+    @property
+    def defaults(self):
+        """ Values of the fields when the Template was compiled. """
+        return {field: self.parts[i] for field, i in self.positions.items()}
+
+    def render(self, values={}):
+        """ Render the netlist.
+
+        Optional inputs:
+        ----------------
+        values (dict):  Values by field, fields without a value keep
+                        their default.
+
+        Returns
+        ----------------
+        netlist (str):  The netlist, like Circuit.netlist.
+        """
+        parts = self.parts.copy()
+        positions = self.positions
+        for field, value in values.items():
+            try:
+                parts[positions[field]] = str(value)
+            except KeyError:
+                raise ValueError("Unknown field: {}".format(field)) from None
+        return "".join(parts)
+
+    def write(self, filename, values={}):
+        """ Write the rendered netlist to file, like Circuit.write().
+
+        Required inputs:
+        ----------------
+        filename (str):     Name of the output file.
+
+
+        Optional inputs:
+        ----------------
+        values (dict):      Values by field, see render().
+
+        Returns
+        ----------------
+        size (int):         Number of bytes written.
+        """
+        netlist = self.render(values)
+        with open_netlist(filename, "w") as ofile:
+            return write_chunks(ofile, [netlist_header(), netlist])
@@ -15,6 +15,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import io
+import copy
+import pickle
 import pytest
 import spatk as sp
 import spatk.flavours.generic as spe
@@ -1346,3 +1349,797 @@ def test_circuit_libraryend_noname():
     cir = sp.Circuit(net_in, is_filename=False, 
                      element_settings={"LibraryEnd": { "noname": True} })
     assert(str(cir) == net_out)
+
+
+def test_clean_lines():
+    netlist = ["R1  neta\tnetb 1E3 $ end of line comment",
+               "* A comment.",
+               "+ tc1 = 1  tc2={ 2 * a }",
+               "",
+               ".include MyLib.spice"]
+    net_out = ["r1 neta netb 1e3 tc1=1 tc2=' 2 * a '",
+               "* A comment.",
+               ".include MyLib.spice"]
+    lines = sp.helpers.clean_lines(netlist, keep_comments=True)
+    assert(not isinstance(lines, list))
+    assert(list(lines) == net_out)
+    assert(sp.helpers.clean_netlist(netlist, keep_comments=True) == net_out)
+
+
+def test_iterparse():
+    netlist = "netlists/generic/complex.sp"
+    cir = sp.Circuit(netlist)
+    elements = sp.iterparse(netlist, syntax="generic")
+    assert(not isinstance(elements, (list, dict)))
+    for uid, element in zip(cir, elements):
+        assert(element.uid == uid)
+        assert(element.location == cir[uid].location)
+        assert(str(element) == str(cir[uid]))
+    assert(sum(1 for _ in sp.iterparse(netlist)) == len(cir))
+
+
+@pytest.mark.parametrize("netlist", ["netlists/generic/simple.sp",
+                                     "netlists/generic/complex.sp",
+                                     "netlists/generic/param/input_param.sp"])
+def test_circuit_init_mmap(netlist):
+    cir = sp.Circuit(netlist)
+    cir_mmap = sp.Circuit(netlist, use_mmap=True)
+    assert(list(cir) == list(cir_mmap))
+    assert(str(cir) == str(cir_mmap))
+
+
+def test_mmap_lines(tmp_path):
+    netlist = tmp_path / "crlf.sp"
+    netlist.write_bytes(b"* comment\r\nr1 a b 1k\r\n\r\n+ \r\n+ tc1=1\r\nc1 a b 1p")
+    lines = list(sp.helpers.mmap_lines(netlist))
+    assert(lines == ["r1 a b 1k", "", "+ ", "+ tc1=1", "c1 a b 1p"])
+    for block_size in [1, 4, 11, 12]:
+        assert(list(sp.helpers.mmap_lines(netlist, block_size=block_size)) == 
+               lines)
+    assert(list(sp.helpers.mmap_lines(netlist, keep_comments=True)) == 
+           ["* comment"] + lines)
+    assert(sp.helpers.read_netlist(netlist, use_mmap=True) == 
+           sp.helpers.read_netlist(netlist))
+
+
+def test_split_netlist():
+    netlist = sp.helpers.read_netlist("netlists/generic/complex.sp")
+    chunks = sp.circuit.split_netlist(netlist, 8)
+    assert(len(chunks) > 1)
+    assert([line for _, lines in chunks for line in lines] == netlist)
+    for offset, lines in chunks:
+        assert(lines[0].split(" ")[0] not in [".ends", ".endl"])
+        assert(netlist[offset] == lines[0])
+
+
+def test_circuit_init_workers():
+    netlist = "netlists/generic/complex.sp"
+    cir = sp.Circuit(netlist)
+    cir_workers = sp.Circuit(netlist, workers=2)
+    assert(list(cir) == list(cir_workers))
+    for uid in cir:
+        assert(cir[uid].n == cir_workers[uid].n)
+        assert(cir[uid].location == cir_workers[uid].location)
+    assert(str(cir) == str(cir_workers))
+
+
+@pytest.mark.parametrize("line, linetype", [("r1 a b 1k", "R"), 
+                                            (".model dmod d", ".MODEL"),
+                                            (".lib mylib", ".LIB"),
+                                            (".library mylib", ".LIBRARY"),
+                                            (".end", "."),
+                                            ("* comment", "*")])
+def test_map_linetype(line, linetype):
+    table = sp.helpers.LinetypeTable(spe.elementmap)
+    assert(table.lookup(line) == linetype)
+    assert(sp.helpers.map_linetype(line, spe.elementmap) == linetype)
+    assert(sp.helpers.map_linetype(line, table) == linetype)
+
+
+def test_circuit_lazy():
+    netlist = "netlists/generic/complex.sp"
+    cir = sp.Circuit(netlist)
+    cir_lazy = sp.Circuit(netlist, lazy=True)
+    assert(str(cir) == str(cir_lazy))
+    assert(all(isinstance(cir_lazy.circuit.raw(uid), tuple) for uid in cir_lazy))
+    uid = cir_lazy.filter("instance", "rs1")[0]
+    assert(cir_lazy[uid].location == "/module/submodule")
+    assert(len(cir_lazy.resistors) == len(cir.resistors))
+    assert(isinstance(cir_lazy.circuit.raw(uid), sp.genelems.Resistor))
+    assert(not isinstance(cir_lazy.circuit.raw(cir_lazy.instance_uid("xmod")), tuple))
+    cir_lazy[uid].value = "2e3"
+    assert("rs1 1 2 2e3\n" in str(cir_lazy))
+    cir_lazy.reset()
+    assert(str(cir) == str(cir_lazy))
+
+
+@pytest.mark.parametrize("line", ["k1 l1 l2 0.9", "%1 a b"])
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_unsupported_element(line, kwargs):
+    netlist = "r1 a b 1k\n{}\n".format(line)
+    with pytest.raises(ValueError, match="Unsupported element"):
+        sp.Circuit(netlist, is_filename=False, **kwargs)
+
+def test_circuit_resolve_includes(tmp_path):
+    (tmp_path / "models").mkdir()
+    (tmp_path / "models" / "Corners.lib").write_text(
+        ".lib tt\n.model nch nmos level=1\n.endl tt\n"
+        ".lib ff\n.model nch nmos level=2\n.endl ff\n")
+    (tmp_path / "cells.sp").write_text(
+        ".lib models/Corners.lib tt\n.subckt inv a y\nm1 y a 0 0 nch\n.ends\n")
+    (tmp_path / "top.sp").write_text(
+        ".include cells.sp\n.lib Corners.lib ff\nx1 a y inv\n")
+    sp.circuit.clear_include_cache()
+    search_paths = [str(tmp_path / "models")]
+    cir = sp.Circuit(str(tmp_path / "top.sp"), 
+                     resolve_includes=True, 
+                     search_paths=search_paths)
+    assert(len(cir.includes) == 2)
+    included = list(cir.included())
+    assert(len(included) == 3)
+    levels = sorted(m.args.level for inc in included for m in inc.models)
+    assert(levels == ["1", "2"])
+    cir_again = sp.Circuit(str(tmp_path / "top.sp"), 
+                           resolve_includes=True, 
+                           search_paths=search_paths)
+    assert(list(cir_again.included())[0] is included[0])
+
+
+def test_load_include_settings(tmp_path):
+    models = tmp_path / "models.sp"
+    models.write_text(".model nch nmos vth0=0.4 tox=2n\n")
+    settings = {"Model": {"expanded": True, "sorted": True}}
+    plain = sp.circuit.load_include(str(models))
+    expanded = sp.circuit.load_include(str(models), element_settings=settings)
+    assert(plain is not expanded)
+    assert(str(expanded) != str(plain))
+    assert(sp.circuit.load_include(str(models)) is plain)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_circuit_cache(tmp_path, monkeypatch, lazy):
+    netlist = "netlists/generic/complex.sp"
+    cache_dir = str(tmp_path / "cache")
+    cir = sp.Circuit(netlist, cache_dir=cache_dir, lazy=lazy)
+    assert(len(list((tmp_path / "cache").iterdir())) == 1)
+    def parse(*args):
+        raise AssertionError("netlist parsed despite cache")
+    monkeypatch.setattr(sp.Circuit, "_parse", parse)
+    cir_cached = sp.Circuit(netlist, cache_dir=cache_dir, lazy=lazy)
+    assert(list(cir) == list(cir_cached))
+    assert(str(cir) == str(cir_cached))
+    with pytest.raises(AssertionError):
+        sp.Circuit(netlist, cache_dir=cache_dir, element_settings={"Model": {}})
+
+
+def test_cache_prune(tmp_path):
+    for i in range(4):
+        sp.cache.store(str(tmp_path), "key{}".format(i), i)
+    sp.cache.prune(str(tmp_path), max_entries=2)
+    assert(len(list(tmp_path.iterdir())) == 2)
+    sp.cache.prune(str(tmp_path), max_age=-1)
+    assert(len(list(tmp_path.iterdir())) == 0)
+
+
+@pytest.mark.parametrize("ext", [".gz", ".bz2", ".xz"])
+def test_circuit_compressed(tmp_path, ext):
+    netlist = "netlists/generic/complex.sp"
+    cir = sp.Circuit(netlist)
+    compressed = str(tmp_path / ("complex.sp" + ext))
+    cir.write(compressed)
+    with open(compressed, "rb") as ifile:
+        assert(not ifile.read().startswith(b"* Netlist written"))
+    cir_compressed = sp.Circuit(compressed, use_mmap=True)
+    assert(str(cir_compressed).split("\n")[2:] == str(cir).split("\n")[2:])
+    renamed = str(tmp_path / "complex_no_extension")
+    (tmp_path / ("complex.sp" + ext)).rename(renamed)
+    assert(len(sp.Circuit(renamed)) == len(cir))
+    assert(len(list(sp.iterparse(renamed))) == len(cir))
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_circuit_reset(lazy):
+    netlist = "netlists/generic/complex.sp"
+    cir = sp.Circuit(netlist, lazy=lazy)
+    net_in = str(cir)
+    uid_r1 = cir.filter("instance", "r1")[0]
+    uid_rt = cir.filter("instance", "rt")[0]
+    uid_c1 = cir.filter("instance", "c1")[0]
+    r1 = cir[uid_r1]
+    rt = cir[uid_rt]
+    rt.value = "5e3"
+    cir.delete(uid_c1)
+    cir.append("r99 1 2 1e3")
+    assert(str(cir) != net_in)
+    cir.reset()
+    assert(str(cir) == net_in)
+    assert(cir[uid_r1] is r1)
+    assert(cir[uid_rt] is not rt)
+    assert(cir[uid_rt].value == "1e3")
+    assert(isinstance(cir.parsed_circuit.raw(uid_rt), tuple))
+
+
+def test_circuit_uid_int():
+    netlist = "netlists/generic/complex.sp"
+    cir = sp.Circuit(netlist, uid_scheme="int")
+    assert(list(cir) == list(range(len(cir))))
+    cir.append("r98 1 2 1e3")
+    cir.append("r98 1 2 1e3")
+    assert(list(cir)[-2:] == [len(cir) - 2, len(cir) - 1])
+    assert(cir[len(cir) - 1].uid == len(cir) - 1)
+    cir.delete(0)
+    assert(0 not in list(cir))
+    cir_workers = sp.Circuit(netlist, uid_scheme="int", workers=2)
+    assert(list(cir_workers) == list(range(len(cir_workers))))
+    assert(str(cir_workers) == str(sp.Circuit(netlist)))
+
+
+def test_circuit_uid_location():
+    netlist = "netlists/generic/param/input_param.sp"
+    cir = sp.Circuit(netlist, uid_scheme="location")
+    assert(list(cir)[:3] == [("/", 0, 0), ("/", 1, 0), ("/", 2, 0)])
+    uid = cir.param_uid("e")
+    assert(cir[uid].n == cir[cir.param_uid("d")].n)
+    cir.delete(uid)
+    assert(cir.param_uid("e") is None)
+
+
+def test_circuit_append_uid():
+    cir = sp.Circuit(["r1 a b 1k"], is_filename=False)
+    cir.append("r2 a b 1k")
+    cir.append("r2 a b 1k")
+    assert(len(cir) == 3)
+    for uid in cir:
+        assert(cir[uid].uid == uid)
+        assert(uid == sp.helpers.get_uid(str(cir[uid]), cir[uid].n))
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_append_unique_uid(kwargs):
+    cir = sp.Circuit(["r1 a b 1k", "r2 c d 1k", "r3 e f 1k"], 
+                     is_filename=False, uid_scheme="location", **kwargs)
+    u1, u2, u3 = list(cir)
+    cir[u3] = copy.deepcopy(cir[u1])
+    cir.append("r9 x y 1k")
+    assert(cir[u2].instance == "r2")
+    assert(cir.net_uids("c") == [u2])
+    assert(len(cir) == 4)
+    u9 = list(cir)[-1]
+    cir.delete(u9)
+    cir.append("r9 x y 1k")
+    assert(list(cir)[-1] != u9)
+    cir = sp.Circuit(["r1 a b 1k"], is_filename=False, 
+                     uid_scheme=lambda line, n, location, k: "same", **kwargs)
+    with pytest.raises(ValueError):
+        cir.append("r2 a b 1k")
+    assert(len(cir) == 1)
+
+
+def test_element_slots():
+    netlist = "netlists/generic/complex.sp"
+    cir = sp.Circuit(netlist)
+    for uid in cir:
+        assert(not hasattr(cir[uid], "__dict__"))
+    m = sp.genelems.Mosfet("m1 d g s b nch w=1u l=2u", "/", None, 0, "u", {})
+    assert(m.nets == ("d", "g", "s", "b"))
+    assert(m.line == "m1 d g s b nch w=1u l=2u")
+    m.ports["n0"] = "x"
+    m.args.w = "3u"
+    assert(m.nets == ("x", "g", "s", "b"))
+    assert(m.args["w"] == "3u")
+    assert(str(m) == "m1 x g s b nch w=3u l=2u")
+    m.ports = {"n0": "d", "n1": "g", "n2": "s", "n3": "b"}
+    assert(str(pickle.loads(pickle.dumps(m))) == "m1 d g s b nch w=3u l=2u")
+
+
+@pytest.mark.parametrize("netlist", ["netlists/generic/complex.sp",
+                                     "netlists/generic/param/input_param.sp"])
+def test_circuit_table(netlist):
+    cir = sp.Circuit(netlist)
+    cir_table = sp.Circuit(netlist, backend="table")
+    assert(isinstance(cir_table.circuit, sp.table.ElementTable))
+    assert(str(cir_table) == str(cir))
+    assert(list(cir_table) == list(cir))
+    assert(cir_table.count_nets() == cir.count_nets())
+    assert(cir_table.element_types() == cir.element_types())
+    assert(cir_table.filter("instance", "m.*") == cir.filter("instance", "m.*"))
+    assert(cir_table.filter("model", ".*") == cir.filter("model", ".*"))
+    assert(cir_table.touches(".*") == cir.touches(".*"))
+    for c in (cir, cir_table):
+        uids = list(c)
+        for uid in uids[::2]:
+            if c[uid].nets:
+                c[uid].ports["n0"] = "new_net"
+        c.delete(uids[1])
+        c.append("r99 new_net 0 1k")
+    assert(str(cir_table) == str(cir))
+    assert(cir_table.touches("new_net") == cir.touches("new_net"))
+    assert(cir_table.count_nets() == cir.count_nets())
+    cir.reset()
+    cir_table.reset()
+    assert(str(cir_table) == str(cir))
+    with pytest.raises(ValueError):
+        sp.Circuit(netlist, backend="columns")
+
+
+def test_table_compact():
+    netlist = ["r{} n{} n{} 1k".format(i, i, i+1) for i in range(100)]
+    cir = sp.Circuit(netlist, is_filename=False)
+    cir_table = sp.Circuit(netlist, is_filename=False, backend="table")
+    table = cir_table.circuit
+    for c in (cir, cir_table):
+        for uid in list(c)[:90]:
+            c.delete(uid)
+    assert(len(table.uids) <= 2*len(table))
+    assert(str(cir_table) == str(cir))
+    size = len(table.net_ids)
+    uid = list(cir)[-1]
+    for i in range(50):
+        for c in (cir, cir_table):
+            if i % 2:
+                line = "m1 a g{} s b nch".format(i)
+                c[uid] = sp.genelems.Mosfet(line, "/", None, 99, uid, {})
+            else:
+                line = "r1 a g{} 1k".format(i)
+                c[uid] = sp.genelems.Resistor(line, "/", None, 99, uid, {})
+        assert(table.count_nets() == cir.count_nets())
+    assert(len(table.net_ids) <= 2*size + 4)
+    assert(table.nets_of(uid) == ("a", "g49", "s", "b"))
+    assert(table.filter("instance", "r9.") == cir.filter("instance", "r9."))
+    assert(str(cir_table) == str(cir))
+
+
+@pytest.mark.parametrize("backend", ["dict", "table"])
+def test_circuit_nets(backend):
+    netlist = ["m1 d g vss vss nch", "m2 d2 g vss vss nch", "r1 d vdd 1k"]
+    cir = sp.Circuit(netlist, is_filename=False, backend=backend)
+    uids = list(cir)
+    assert(cir.net_id("vss") is not None)
+    assert(cir.net_id("unknown") is None)
+    assert(cir.net_name(cir.net_id("vdd")) == "vdd")
+    assert(cir.port_ids(uids[0])[2:] == cir.port_ids(uids[1])[2:])
+    assert(cir[uids[0]].nets[2] is cir[uids[1]].nets[2])
+    cir.append("c1 vdd vss 1p")
+    assert(cir.port_ids(list(cir)[-1]) == (cir.net_id("vdd"), cir.net_id("vss")))
+    cir[uids[2]].ports["n0"] = "new_net"
+    assert(cir.net_name(cir.port_ids(uids[2])[0]) == "new_net")
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_net_index(kwargs):
+    netlist = ["m1 d g vss vss nch", "m2 d2 g vss vss nch", "r1 d vdd 1k"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    m1, m2, r1 = list(cir)
+    assert(cir.net_uids("vss") == [m1, m1, m2, m2])
+    assert(cir.net_uids("d") == [m1, r1])
+    assert(cir.net_uids("unknown") == [])
+    assert(cir.touches("d.*") == [m1, m2, r1])
+    cir[r1].ports["n0"] = "d2"
+    assert(cir.net_uids("d") == [m1])
+    assert(cir.net_uids("d2") == [m2, r1])
+    cir.delete(m2)
+    assert(cir.net_uids("d2") == [r1])
+    cir.append("c1 d2 vss 1p")
+    c1 = list(cir)[-1]
+    assert(cir.net_uids("d2") == [r1, c1])
+    cir.apply(lambda e: e, [m1])
+    assert(cir.touches("vss") == [m1, m1, c1])
+    cir.reset()
+    assert(cir.net_uids("d2") == [m2])
+    assert(cir.touches("vss") == sp.helpers.touches(cir.circuit, "vss"))
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_setitem_copy(kwargs):
+    cir = sp.Circuit(["r1 a b 1k"], is_filename=False, **kwargs)
+    r1 = list(cir)[0]
+    cir["k"] = copy.deepcopy(cir[r1])
+    str(cir)
+    cir["k"].ports["n0"] = "q"
+    cir["k"].value = "2k"
+    assert(cir.net_uids("q") == ["k"])
+    assert(cir.net_uids("a") == [r1])
+    assert(str(cir).splitlines()[2:] == ["r1 a b 1k", "r1 q b 2k"])
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_setitem_owned(kwargs):
+    a = sp.Circuit(["r1 x b 1k"], is_filename=False, **kwargs)
+    b = sp.Circuit(["r1 x b 1k"], is_filename=False, **kwargs)
+    u = list(a)[0]
+    b[u] = a[u]
+    str(a)
+    str(b)
+    a[u].ports["n0"] = "q"
+    assert(str(a).splitlines()[2:] == ["r1 q b 1k"])
+    assert(a.net_uids("q") == [u] and a.net_uids("x") == [])
+    assert(str(b).splitlines()[2:] == ["r1 x b 1k"])
+    b[u].value = "2k"
+    assert(str(b).splitlines()[2:] == ["r1 x b 2k"])
+    b["k"] = b[u]
+    assert(str(b).splitlines()[2:] == ["r1 x b 2k", "r1 x b 2k"])
+    assert(b["k"] is not b[u])
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+@pytest.mark.parametrize("duplicate", [copy.deepcopy, 
+                                       lambda cir: pickle.loads(pickle.dumps(cir))])
+def test_circuit_copy_edit(kwargs, duplicate):
+    cir = sp.Circuit(["r1 a b 1k", "r2 b c 1k"], is_filename=False, **kwargs)
+    r1, r2 = list(cir)
+    cir[r1]
+    str(cir)
+    other = duplicate(cir)
+    other[r1].ports["n0"] = "q"
+    other[r1].value = "2k"
+    other[r2].args["tc1"] = "1"
+    assert(other.net_uids("q") == [r1])
+    assert(str(other).splitlines()[2:] == ["r1 q b 2k", "r2 b c 1k tc1=1"])
+    assert(cir.net_uids("q") == [])
+    assert(str(cir).splitlines()[2:] == ["r1 a b 1k", "r2 b c 1k"])
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_name_index(kwargs):
+    netlist = [".param a=1 b=2", "r1 n1 n2 1k", "r2 n2 n3 1k",
+               ".subckt sub in out", "r1 in out 1k", ".ends"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    r1 = cir.instance_uid("r1")
+    assert(cir[r1].location == "/")
+    assert(cir[cir.instance_uid("r1", "/sub")].location == "/sub")
+    assert(cir.instance_uids(["r2", "r1", "r3"]) == [cir.instance_uid("r2"), r1, None])
+    assert(cir.param_uids(["b", "a"]) == [cir.param_uid("b"), cir.param_uid("a")])
+    cir[r1].instance = "r3"
+    assert(cir.instance_uid("r1") is None)
+    assert(cir.instance_uid("r3") == r1)
+    cir[r1].location = "/sub"
+    assert(cir.instance_uid("r3") is None)
+    assert(cir.instance_uid("r3", "/sub") == r1)
+    b = cir.param_uid("b")
+    cir[b].name = "c"
+    assert(cir.param_uid("b") is None)
+    assert(cir.param_uid("c") == b)
+    cir.delete(b)
+    assert(cir.param_uid("c") is None)
+    cir.append("r4 n1 n3 1k")
+    cir.append("r4 n1 n3 2k")
+    assert(cir[cir.instance_uid("r4")].value == "1k")
+    cir.append("r4 n1 n3 3k")
+    cir.delete(cir.instance_uid("r4"))
+    assert(cir[cir.instance_uid("r4")].value == "2k")
+    other = sp.Circuit([".param p=1", "r2 c d 2k", "r3 e f 3k"], 
+                       is_filename=False, **kwargs)
+    u0, u1, u2 = list(other)
+    other[u0] = copy.deepcopy(other[u2])
+    assert(other.instance_uid("r3") == u0)
+    cir.reset()
+    assert(cir.instance_uid("r1") == r1)
+    assert(cir.instance_uid("r4") is None)
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_type_views(kwargs):
+    netlist = ["r1 a b 1k", "c1 a b 1p", "r2 b c 1k", ".param x=1"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    resistors = cir.resistors
+    assert(isinstance(resistors, sp.circuit.ElementView))
+    assert([r.instance for r in resistors] == ["r1", "r2"])
+    assert(len(cir.params) == 1)
+    cir.append("r3 c d 1k")
+    cir.delete(cir.instance_uid("r1"))
+    assert([r.instance for r in resistors] == ["r2", "r3"])
+    assert(resistors[-1].instance == "r3")
+    uid = cir.instance_uid("c1")
+    cir[uid] = sp.genelems.Resistor("r4 a b 1k", "/", None, 1, uid, {})
+    assert([r.instance for r in cir.resistors] == ["r4", "r2", "r3"])
+    resistors.uids().clear()
+    assert(resistors[0].instance == "r4" and len(resistors.uids()) == 3)
+    assert(len(cir.capacitors) == 0)
+    cir.reset()
+    assert(cir.resistors == [cir[cir.instance_uid("r1")], cir[cir.instance_uid("r2")]])
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_query(kwargs):
+    netlist = [".subckt core a b",
+               "m1 a b 0 0 nch_lvt w=1u l=1u",
+               "m2 a b 0 0 pch w=1u l=1u",
+               ".subckt bias a b",
+               "m3 a b 0 0 nch w=1u l=1u",
+               "r1 a vdd 1k",
+               ".ends",
+               ".ends",
+               "m4 vdd b 0 0 nch w=1u l=1u",
+               "r2 vdd 0 1k"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    query = [("type", "==", "mosfet"), 
+             ("model", "~", "nch.*"), 
+             ("location", "under", "/core")]
+    uids = cir.query(query)
+    assert([cir[uid].instance for uid in uids] == ["m1", "m3"])
+    uids = cir.query([("nets", "touches", "vdd"), ("type", "!=", "mosfet")])
+    assert([cir[uid].instance for uid in uids] == ["r1", "r2"])
+    uids = cir.query([("instance", "in", ["m4", "r1"]), ("location", "==", "/")])
+    assert([cir[uid].instance for uid in uids] == ["m4"])
+    assert(cir.query([("type", "~", "resistor")]) == cir.filter("type", "resistor"))
+    compiled = sp.query.Query(query)
+    cir[cir.instance_uid("m4")].location = "/core"
+    cir.delete(cir.instance_uid("m1", "/core"))
+    assert([cir[uid].instance for uid in cir.query(compiled)] == ["m3", "m4"])
+    with pytest.raises(ValueError):
+        cir.query([("model", "like", "nch")])
+
+
+def test_netlist_header():
+    header = sp.helpers.netlist_header("top")
+    assert(header.startswith("* Netlist written: "))
+    assert(header.endswith("\n* top\n\n"))
+    assert(sp.helpers.netlist_header().count("\n") == 1)
+
+
+def test_spice_number():
+    assert(sp.helpers.spice_number("10u") == 10e-6)
+    assert(sp.helpers.spice_number("1.5MEG") == 1.5e6)
+    assert(sp.helpers.spice_number("2kOhm") == 2e3)
+    assert(sp.helpers.spice_number("1e-3") == 1e-3)
+    assert(sp.helpers.spice_number("1m") == 1e-3)
+    assert(sp.helpers.spice_number(3) == 3.0)
+    assert(sp.helpers.spice_number("{2*w}") is None)
+    assert(sp.helpers.spice_number("nch") is None)
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_range(kwargs):
+    netlist = ["m1 d g s b nch w=1u l=1u",
+               "m2 d g s b nch w=20u l=1u",
+               "m3 d g s b nch w={wmin} l=1u",
+               "m4 d g s b nch w=12u l=1u",
+               "r1 a b 1k",
+               "r2 a b 0.5m",
+               "c1 a b 1p",
+               "c2 a b 10p",
+               "c3 a b 2f"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    def names(uids):
+        return [cir[uid].instance for uid in uids]
+    assert(names(cir.range("mosfet", "w", low="10u", inclusive="neither")) == ["m4", "m2"])
+    assert(names(cir.range("resistor", "value", high="1m", inclusive="neither")) == ["r2"])
+    assert(names(cir.top("capacitor", "value", 2)) == ["c2", "c1"])
+    assert(names(cir.top("capacitor", "capacitance", 1, largest=False)) == ["c3"])
+    cir[cir.instance_uid("m1")].args.w = "15u"
+    cir[cir.instance_uid("m2")].args = sp.genelems.Args(["w=5u"])
+    cir[cir.instance_uid("r1")].value = "0.1m"
+    cir.append("m5 d g s b nch w=30u")
+    cir.delete(cir.instance_uid("m4"))
+    assert(names(cir.range("mosfet", "w", low="10u")) == ["m1", "m5"])
+    assert(names(cir.range("resistor", "value", high="1m")) == ["r1", "r2"])
+    assert(names(cir.query([("type", "==", "mosfet"), ("w", ">", "10u")])) == ["m1", "m5"])
+    with pytest.raises(ValueError):
+        cir.range("mosfet", "w", low="wmin")
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_hierarchy(kwargs):
+    netlist = [".subckt inv a y",
+               "m1 y a 0 0 nch w=1u l=1u",
+               ".ends",
+               ".subckt buf a y",
+               ".subckt inv a y",
+               "r1 a y 1k",
+               ".ends",
+               "x1 a n inv",
+               "x2 n y inv",
+               ".ends",
+               "xb1 in mid buf",
+               "xb2 mid out buf",
+               "xi1 out inv_out inv"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    def names(uids):
+        return [cir[uid].instance for uid in uids]
+    cir.append("xp1 out p1 inv w=2u")
+    cir.append("xp2 out p2 inv params: w=2u")
+    assert(names(cir.subckt_instances("inv", "/")) == ["xi1", "xp1", "xp2"])
+    cir.delete([cir.instance_uid("xp1"), cir.instance_uid("xp2")])
+    assert(cir.subckt_uid("inv") == cir.subckt_uid("inv", "/inv"))
+    assert(cir[cir.subckt_uid("inv")].location == "/inv")
+    assert(cir[cir.subckt_uid("inv", "/buf")].location == "/buf/inv")
+    assert(cir.subckt_uid("nand") is None)
+    body = cir.subckt_body("buf")
+    assert(len(body) == 7)
+    assert(body[0] == cir.subckt_uid("buf") and cir[body[-1]].line == ".ends")
+    assert(names(cir.subckt_instances("inv")) == ["x1", "x2", "xi1"])
+    assert(names(cir.subckt_instances("inv", "/buf")) == ["x1", "x2"])
+    assert(cir.subckt_children() == {"buf": 2, "inv": 1})
+    assert(cir.subckt_children("buf") == {"inv": 2})
+    assert(cir.subckt_children("inv") == {})
+    assert(cir.subckt_parents("inv") == {"/buf": 2, "/": 1})
+    cir.append("xi2 inv_out out2 inv")
+    cir.delete(cir.instance_uid("xb2"))
+    cir[cir.instance_uid("xi1")].name = "buf"
+    assert(names(cir.subckt_instances("inv")) == ["x1", "x2", "xi2"])
+    assert(names(cir.subckt_instances("buf")) == ["xb1", "xi1"])
+    assert(cir.subckt_children() == {"buf": 2, "inv": 1})
+    cir.reset()
+    assert(cir.subckt_children() == {"buf": 2, "inv": 1})
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_flatten(kwargs, tmp_path):
+    netlist = [".global vdd",
+               ".subckt inv a y",
+               "m1 y a 0 0 nch w=1u l=1u",
+               "m2 y a vdd vdd pch w=2u l=1u",
+               ".ends",
+               ".subckt buf a y",
+               "x1 a n inv",
+               "x2 n y inv",
+               "c1 n 0 1f",
+               ".ends",
+               "xb1 in out buf",
+               "r1 out 0 1k"]
+    flat = ["m.xb1.x1.m1 xb1.n in 0 0 nch w=1u l=1u",
+            "m.xb1.x1.m2 xb1.n in vdd vdd pch w=2u l=1u",
+            "m.xb1.x2.m1 out xb1.n 0 0 nch w=1u l=1u",
+            "m.xb1.x2.m2 out xb1.n vdd vdd pch w=2u l=1u",
+            "c.xb1.c1 xb1.n 0 1f"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    flattened = cir.flatten()
+    assert(flattened.netlist.splitlines()[2:] == [".global vdd", *flat, "r1 out 0 1k"])
+    assert(flattened.backend == cir.backend)
+    assert(len(flattened.subckts) == 0)
+    filename = str(tmp_path / "flat.sp")
+    size = cir.flatten(filename)
+    with open(filename) as ifile:
+        written = ifile.read()
+    assert(size == len(written))
+    assert(written.splitlines()[3:] == flattened.netlist.splitlines()[2:])
+    cir[cir.instance_uid("m1", "/inv")].args.w = "3u"
+    assert(cir.flatten().netlist.count("w=3u") == 2)
+    # Deeper than the recursion limit of Python.
+    netlist = [".subckt c0 a b", "r1 a b 1", ".ends"]
+    for i in range(1, 1500):
+        netlist.extend([".subckt c{} a b".format(i), 
+                        "x1 a m c{}".format(i - 1), 
+                        "r1 m b 1", 
+                        ".ends"])
+    netlist.append("x1 in out c1499")
+    flattened = sp.Circuit(netlist, is_filename=False, **kwargs).flatten()
+    assert(len(flattened.resistors) == 1500)
+    with pytest.raises(ValueError):
+        sp.Circuit([".subckt a p", "x1 p a", ".ends", "x1 n a"], 
+                   is_filename=False, **kwargs).flatten()
+    with pytest.raises(ValueError):
+        sp.Circuit(["x1 n b"], is_filename=False, **kwargs).flatten()
+    netlist = [".subckt inv a y", "xm1 y a 0 0 nch w=1u l=1u", ".ends", "x1 i o inv"]
+    flattened = sp.Circuit(netlist, is_filename=False, syntax="ngspice", **kwargs).flatten()
+    assert(flattened.netlist.splitlines()[2:] == ["xm.x1.xm1 o i 0 0 nch w=1u l=1u"])
+    assert(len(flattened.mosfets) == 1)
+    with pytest.raises(ValueError, match="parameters"):
+        sp.Circuit([".subckt s a b", "r1 a b 1k", ".ends", "x1 p q s w=2u"], 
+                   is_filename=False, **kwargs).flatten()
+    with pytest.raises(ValueError, match="behavioral_source"):
+        sp.Circuit([".subckt s a b", "b1 a b v=v(a)*2", ".ends", "x1 p q s"], 
+                   is_filename=False, **kwargs).flatten()
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_group_by(kwargs):
+    netlist = [".subckt core a b",
+               "m1 a b 0 0 nch w=1u l=1u",
+               "m2 a b 0 0 pch w=2u l=1u",
+               "m3 a b 0 0 nch w=3u l={lmin}",
+               ".ends",
+               "m4 a b 0 0 nch w=4u l=2u",
+               "r1 a 0 1k",
+               "r2 b 0 3k"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    groups = cir.group_by(["model", "location"], 
+                          ["count", ("sum", "w"), ("max", "l")], 
+                          [("type", "==", "mosfet")])
+    assert(list(groups) == [("nch", "/core"), ("pch", "/core"), ("nch", "/")])
+    assert(groups[("nch", "/core")]["count"] == 2)
+    assert(groups[("nch", "/core")]["sum_w"] == pytest.approx(4e-6))
+    assert(groups[("nch", "/core")]["max_l"] == 1e-6)
+    assert(groups[("nch", "/")]["max_l"] == 2e-6)
+    assert(cir.group_by("type")["mosfet"] == {"count": 4})
+    assert(cir.group_by("location", where=[("type", "==", "resistor")]) == {"/": {"count": 2}})
+    assert(cir.group_by("type", [("sum", "value")])["resistor"] == {"sum_value": 4e3})
+    assert(cir.group_by("nets")["0"] == {"count": 10})
+    assert(cir.count_nets() == sp.helpers.count_nets(cir.circuit))
+    assert(cir.element_types() == sp.helpers.element_types(cir.circuit))
+    with pytest.raises(ValueError):
+        cir.group_by("type", ["mean"])
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_dirty_synthesis(kwargs):
+    netlist = ["m1 d g s b nch w=1u l=1u",
+               "r1 a b 1k",
+               ".model nch nmos vth0=0.4",
+               ".param wmin=1u",
+               "x1 a b inv"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    uids = list(cir)
+    for uid in uids:
+        cir[uid]
+    before = str(cir).splitlines()
+    cir[uids[0]].args.w = "2u"
+    cir[uids[1]].value = "2k"
+    cir[uids[2]].elements[1] = "nch2"
+    cir[uids[3]].value = "2u"
+    cir[uids[4]].name = "inv2"
+    after = str(cir).splitlines()
+    assert(after[:2] == before[:2])
+    assert(after[2:] == ["m1 d g s b nch w=2u l=1u",
+                         "r1 a b 2k",
+                         ".model nch2 nmos vth0=0.4",
+                         ".param wmin=2u",
+                         "x1 a b inv2"])
+    cir.append("c1 a b 1p")
+    cir.delete(uids[1])
+    assert(str(cir).splitlines()[2:] == ["m1 d g s b nch w=2u l=1u",
+                                         ".model nch2 nmos vth0=0.4",
+                                         ".param wmin=2u",
+                                         "x1 a b inv2",
+                                         "c1 a b 1p"])
+    cir.reset()
+    assert(str(cir).splitlines() == before)
+    lines = list(cir._netlist)
+    str(cir)
+    assert(all(a is b for a, b in zip(lines[1:], cir._netlist[1:])))
+    cir.append("v1 a 0 dc 1 ac 1")
+    str(cir)
+    cir[cir.instance_uid("v1")].value[1] = "5"
+    cir[uids[4]].elements = ["x1", "a", "b", "amp"]
+    cir[uids[0]].argsdata = sp.genelems.Args(["w=3u"])
+    assert(str(cir).splitlines()[2:] == ["m1 d g s b nch w=3u",
+                                         "r1 a b 1k",
+                                         ".model nch nmos vth0=0.4",
+                                         ".param wmin=1u",
+                                         "x1 a b amp",
+                                         "v1 a 0 dc 5 ac 1"])
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_compile_template(kwargs):
+    netlist = [".param wmin=1u",
+               "m1 d g s b nch w=1u l=1u",
+               "r1 a b 1k",
+               ".model nch nmos vth0=0.4"]
+    cir = sp.Circuit(netlist, is_filename=False, **kwargs)
+    m1 = cir.instance_uid("m1")
+    r1 = cir.instance_uid("r1")
+    template = cir.compile_template(["wmin", (m1, "w"), (r1, "value")])
+    assert(template.render() == str(cir))
+    assert(template.defaults == {"wmin": "1u", (m1, "w"): "1u", (r1, "value"): "1k"})
+    netlist = template.render({"wmin": "2u", (m1, "w"): "5u"})
+    assert(netlist.splitlines()[2:] == [".param wmin=2u",
+                                        "m1 d g s b nch w=5u l=1u",
+                                        "r1 a b 1k",
+                                        ".model nch nmos vth0=0.4"])
+    cir[m1].args.w = "7u"
+    assert(template.render() != str(cir))
+    with pytest.raises(ValueError):
+        template.render({"wmax": "1u"})
+    with pytest.raises(ValueError):
+        cir.compile_template([(m1, "nf")])
+    with pytest.raises(ValueError):
+        cir.compile_template(["wmax"])
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"lazy": True}, {"backend": "table"}])
+def test_circuit_write_to(tmp_path, kwargs):
+    cir = sp.Circuit("netlists/generic/complex.sp", **kwargs)
+    cir.append("r9 a b 1k")
+    text = io.StringIO()
+    size = cir.write_to(text, chunk_size=3)
+    header, netlist = text.getvalue().split("\n", 1)
+    assert(header.startswith("* Netlist written: "))
+    assert(netlist == cir.netlist)
+    assert(size == len(text.getvalue()))
+    binary = io.BytesIO()
+    assert(cir.write_to(binary) == len(binary.getvalue()))
+    assert(binary.getvalue().split(b"\n", 1)[1] == netlist.encode())
+    filename = tmp_path / "out.sp"
+    assert(cir.write(filename) == filename.stat().st_size)
+    assert(filename.read_text().split("\n", 1)[1] == netlist)